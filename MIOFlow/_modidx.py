@@ -5,7 +5,19 @@ d = { 'settings': { 'branch': 'main',
                 'doc_host': 'https://KrishnaswamyLab.github.io',
                 'git_url': 'https://github.com/KrishnaswamyLab/MIOFlow/tree/main/',
                 'lib_path': 'MIOFlow'},
-  'syms': { 'MIOFlow.constants': {},
+  'syms': { 'MIOFlow.bench': { 'MIOFlow.bench.SampleSizeCurriculum': ('bench.html#samplesizecurriculum', 'MIOFlow/bench.py'),
+                               'MIOFlow.bench.SampleSizeCurriculum.__call__': ( 'bench.html#samplesizecurriculum.__call__',
+                                                                                'MIOFlow/bench.py'),
+                               'MIOFlow.bench.SampleSizeCurriculum.__init__': ( 'bench.html#samplesizecurriculum.__init__',
+                                                                                'MIOFlow/bench.py'),
+                               'MIOFlow.bench._rss_mb': ('bench.html#_rss_mb', 'MIOFlow/bench.py'),
+                               'MIOFlow.bench.benchmark_models': ('bench.html#benchmark_models', 'MIOFlow/bench.py'),
+                               'MIOFlow.bench.benchmark_odes': ('bench.html#benchmark_odes', 'MIOFlow/bench.py'),
+                               'MIOFlow.bench.benchmark_sde_solvers': ('bench.html#benchmark_sde_solvers', 'MIOFlow/bench.py'),
+                               'MIOFlow.bench.peak_memory': ('bench.html#peak_memory', 'MIOFlow/bench.py'),
+                               'MIOFlow.bench.time_per_call': ('bench.html#time_per_call', 'MIOFlow/bench.py'),
+                               'MIOFlow.bench.tune_sample_size': ('bench.html#tune_sample_size', 'MIOFlow/bench.py')},
+            'MIOFlow.constants': {},
             'MIOFlow.datasets': { 'MIOFlow.datasets.construct_diamond': ('datasets.html#construct_diamond', 'MIOFlow/datasets.py'),
                                   'MIOFlow.datasets.make_diamonds': ('datasets.html#make_diamonds', 'MIOFlow/datasets.py'),
                                   'MIOFlow.datasets.make_dyngen_data': ('datasets.html#make_dyngen_data', 'MIOFlow/datasets.py'),
@@ -17,14 +29,19 @@ d = { 'settings': { 'branch': 'main',
                                   'MIOFlow.datasets.make_worm_data': ('datasets.html#make_worm_data', 'MIOFlow/datasets.py'),
                                   'MIOFlow.datasets.relabel_data': ('datasets.html#relabel_data', 'MIOFlow/datasets.py'),
                                   'MIOFlow.datasets.rings': ('datasets.html#rings', 'MIOFlow/datasets.py')},
-            'MIOFlow.eval': { 'MIOFlow.eval.calculate_nn': ('eval.html#calculate_nn', 'MIOFlow/eval.py'),
+            'MIOFlow.eval': { 'MIOFlow.eval._dense_step': ('eval.html#_dense_step', 'MIOFlow/eval.py'),
+                              'MIOFlow.eval.calculate_nn': ('eval.html#calculate_nn', 'MIOFlow/eval.py'),
+                              'MIOFlow.eval.compute_jacobians': ('eval.html#compute_jacobians', 'MIOFlow/eval.py'),
+                              'MIOFlow.eval.compute_trajectory_jacobians': ('eval.html#compute_trajectory_jacobians', 'MIOFlow/eval.py'),
                               'MIOFlow.eval.generate_plot_data': ('eval.html#generate_plot_data', 'MIOFlow/eval.py'),
                               'MIOFlow.eval.generate_points': ('eval.html#generate_points', 'MIOFlow/eval.py'),
                               'MIOFlow.eval.generate_tjnet_trajectories': ('eval.html#generate_tjnet_trajectories', 'MIOFlow/eval.py'),
                               'MIOFlow.eval.generate_trajectories': ('eval.html#generate_trajectories', 'MIOFlow/eval.py'),
                               'MIOFlow.eval.get_cell_indexes': ('eval.html#get_cell_indexes', 'MIOFlow/eval.py'),
-                              'MIOFlow.eval.get_points_from_trajectories': ('eval.html#get_points_from_trajectories', 'MIOFlow/eval.py')},
+                              'MIOFlow.eval.get_points_from_trajectories': ('eval.html#get_points_from_trajectories', 'MIOFlow/eval.py'),
+                              'MIOFlow.eval.project_jacobians': ('eval.html#project_jacobians', 'MIOFlow/eval.py')},
             'MIOFlow.exp': { 'MIOFlow.exp.config_exp_logger': ('exp.html#config_exp_logger', 'MIOFlow/exp.py'),
+                             'MIOFlow.exp.exp_checkpoint_filename': ('exp.html#exp_checkpoint_filename', 'MIOFlow/exp.py'),
                              'MIOFlow.exp.exp_log_filename': ('exp.html#exp_log_filename', 'MIOFlow/exp.py'),
                              'MIOFlow.exp.exp_param_filename': ('exp.html#exp_param_filename', 'MIOFlow/exp.py'),
                              'MIOFlow.exp.find_exps': ('exp.html#find_exps', 'MIOFlow/exp.py'),
@@ -51,6 +68,10 @@ d = { 'settings': { 'branch': 'main',
                              'MIOFlow.geo.PhateDistance': ('geo.html#phatedistance', 'MIOFlow/geo.py'),
                              'MIOFlow.geo.PhateDistance.__init__': ('geo.html#phatedistance.__init__', 'MIOFlow/geo.py'),
                              'MIOFlow.geo.PhateDistance.fit': ('geo.html#phatedistance.fit', 'MIOFlow/geo.py'),
+                             'MIOFlow.geo.PrecomputedDistance': ('geo.html#precomputeddistance', 'MIOFlow/geo.py'),
+                             'MIOFlow.geo.PrecomputedDistance.__init__': ('geo.html#precomputeddistance.__init__', 'MIOFlow/geo.py'),
+                             'MIOFlow.geo.PrecomputedDistance._square': ('geo.html#precomputeddistance._square', 'MIOFlow/geo.py'),
+                             'MIOFlow.geo.PrecomputedDistance.take': ('geo.html#precomputeddistance.take', 'MIOFlow/geo.py'),
                              'MIOFlow.geo.old_DiffusionDistance': ('geo.html#old_diffusiondistance', 'MIOFlow/geo.py'),
                              'MIOFlow.geo.old_DiffusionDistance.__init__': ('geo.html#old_diffusiondistance.__init__', 'MIOFlow/geo.py'),
                              'MIOFlow.geo.old_DiffusionDistance.compute_custom_diffusion_distance': ( 'geo.html#old_diffusiondistance.compute_custom_diffusion_distance',
@@ -85,17 +106,68 @@ d = { 'settings': { 'branch': 'main',
                                 'MIOFlow.models.Autoencoder.decode': ('models.html#autoencoder.decode', 'MIOFlow/models.py'),
                                 'MIOFlow.models.Autoencoder.encode': ('models.html#autoencoder.encode', 'MIOFlow/models.py'),
                                 'MIOFlow.models.Autoencoder.forward': ('models.html#autoencoder.forward', 'MIOFlow/models.py'),
+                                'MIOFlow.models.DenseTrajectory': ('models.html#densetrajectory', 'MIOFlow/models.py'),
+                                'MIOFlow.models.DenseTrajectory.__call__': ('models.html#densetrajectory.__call__', 'MIOFlow/models.py'),
+                                'MIOFlow.models.DenseTrajectory.__init__': ('models.html#densetrajectory.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models.EnsembleODE': ('models.html#ensembleode', 'MIOFlow/models.py'),
+                                'MIOFlow.models.EnsembleODE.__init__': ('models.html#ensembleode.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models.EnsembleODE._member_field': ('models.html#ensembleode._member_field', 'MIOFlow/models.py'),
+                                'MIOFlow.models.EnsembleODE._stacked': ('models.html#ensembleode._stacked', 'MIOFlow/models.py'),
+                                'MIOFlow.models.EnsembleODE._vector_field': ('models.html#ensembleode._vector_field', 'MIOFlow/models.py'),
+                                'MIOFlow.models.EnsembleODE.member': ('models.html#ensembleode.member', 'MIOFlow/models.py'),
+                                'MIOFlow.models.FusedToyODE': ('models.html#fusedtoyode', 'MIOFlow/models.py'),
+                                'MIOFlow.models.FusedToyODE.__init__': ('models.html#fusedtoyode.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models.FusedToyODE._vector_field': ('models.html#fusedtoyode._vector_field', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToyModel': ('models.html#toymodel', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToyModel.__init__': ('models.html#toymodel.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyModel._members': ('models.html#toymodel._members', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyModel._solve': ('models.html#toymodel._solve', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyModel._trace': ('models.html#toymodel._trace', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyModel.backprop_memory': ('models.html#toymodel.backprop_memory', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyModel.dense_forward': ('models.html#toymodel.dense_forward', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToyModel.forward': ('models.html#toymodel.forward', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyModel.log_likelihood': ('models.html#toymodel.log_likelihood', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyModel.shooting_forward': ('models.html#toymodel.shooting_forward', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyModel.use_adjoint': ('models.html#toymodel.use_adjoint', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToyODE': ('models.html#toyode', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToyODE.__init__': ('models.html#toyode.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyODE._vector_field': ('models.html#toyode._vector_field', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyODE.callback_step': ('models.html#toyode.callback_step', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyODE.callback_step_adjoint': ( 'models.html#toyode.callback_step_adjoint',
+                                                                                 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToyODE.forward': ('models.html#toyode.forward', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToyODE.reset_nfe': ('models.html#toyode.reset_nfe', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToySDEModel': ('models.html#toysdemodel', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToySDEModel.__init__': ('models.html#toysdemodel.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToySDEModel._levy_area_approximation': ( 'models.html#toysdemodel._levy_area_approximation',
+                                                                                         'MIOFlow/models.py'),
+                                'MIOFlow.models.ToySDEModel._sdeint_kwargs': ( 'models.html#toysdemodel._sdeint_kwargs',
+                                                                               'MIOFlow/models.py'),
+                                'MIOFlow.models.ToySDEModel.brownian_motion': ( 'models.html#toysdemodel.brownian_motion',
+                                                                                'MIOFlow/models.py'),
                                 'MIOFlow.models.ToySDEModel.f': ('models.html#toysdemodel.f', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToySDEModel.forward': ('models.html#toysdemodel.forward', 'MIOFlow/models.py'),
                                 'MIOFlow.models.ToySDEModel.g': ('models.html#toysdemodel.g', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToySDEModel.sample': ('models.html#toysdemodel.sample', 'MIOFlow/models.py'),
+                                'MIOFlow.models.ToySDEModel.set_solver': ('models.html#toysdemodel.set_solver', 'MIOFlow/models.py'),
+                                'MIOFlow.models._AugmentedODE': ('models.html#_augmentedode', 'MIOFlow/models.py'),
+                                'MIOFlow.models._AugmentedODE.__init__': ('models.html#_augmentedode.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models._AugmentedODE.forward': ('models.html#_augmentedode.forward', 'MIOFlow/models.py'),
+                                'MIOFlow.models._ODEWrapper': ('models.html#_odewrapper', 'MIOFlow/models.py'),
+                                'MIOFlow.models._ODEWrapper.__init__': ('models.html#_odewrapper.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models._ODEWrapper.callback_step': ('models.html#_odewrapper.callback_step', 'MIOFlow/models.py'),
+                                'MIOFlow.models._ODEWrapper.callback_step_adjoint': ( 'models.html#_odewrapper.callback_step_adjoint',
+                                                                                      'MIOFlow/models.py'),
+                                'MIOFlow.models._ShootingODE': ('models.html#_shootingode', 'MIOFlow/models.py'),
+                                'MIOFlow.models._ShootingODE.__init__': ('models.html#_shootingode.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models._ShootingODE.forward': ('models.html#_shootingode.forward', 'MIOFlow/models.py'),
+                                'MIOFlow.models._StepRecorder': ('models.html#_steprecorder', 'MIOFlow/models.py'),
+                                'MIOFlow.models._StepRecorder.__init__': ('models.html#_steprecorder.__init__', 'MIOFlow/models.py'),
+                                'MIOFlow.models._StepRecorder._record': ('models.html#_steprecorder._record', 'MIOFlow/models.py'),
+                                'MIOFlow.models._StepRecorder.forward': ('models.html#_steprecorder.forward', 'MIOFlow/models.py'),
+                                'MIOFlow.models._divergence': ('models.html#_divergence', 'MIOFlow/models.py'),
+                                'MIOFlow.models._fixed_grid_odeint': ('models.html#_fixed_grid_odeint', 'MIOFlow/models.py'),
+                                'MIOFlow.models.compile_ode': ('models.html#compile_ode', 'MIOFlow/models.py'),
                                 'MIOFlow.models.make_model': ('models.html#make_model', 'MIOFlow/models.py')},
             'MIOFlow.ode': { 'MIOFlow.ode.NeuralODE': ('ode.html#neuralode', 'MIOFlow/ode.py'),
                              'MIOFlow.ode.NeuralODE.__init__': ('ode.html#neuralode.__init__', 'MIOFlow/ode.py'),
@@ -107,21 +179,104 @@ d = { 'settings': { 'branch': 'main',
                              'MIOFlow.ode.ODEF.flatten_parameters': ('ode.html#odef.flatten_parameters', 'MIOFlow/ode.py'),
                              'MIOFlow.ode.ODEF.forward_with_grad': ('ode.html#odef.forward_with_grad', 'MIOFlow/ode.py'),
                              'MIOFlow.ode.ode_solve': ('ode.html#ode_solve', 'MIOFlow/ode.py')},
+            'MIOFlow.parallel': { 'MIOFlow.parallel.DataParallelOptimizer': ('parallel.html#dataparalleloptimizer', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.DataParallelOptimizer.__getattr__': ( 'parallel.html#dataparalleloptimizer.__getattr__',
+                                                                                          'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.DataParallelOptimizer.__init__': ( 'parallel.html#dataparalleloptimizer.__init__',
+                                                                                       'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.DataParallelOptimizer.step': ( 'parallel.html#dataparalleloptimizer.step',
+                                                                                   'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.PlotWorker': ('parallel.html#plotworker', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.PlotWorker.__init__': ('parallel.html#plotworker.__init__', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.PlotWorker._put': ('parallel.html#plotworker._put', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.PlotWorker._warn': ('parallel.html#plotworker._warn', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.PlotWorker.close': ('parallel.html#plotworker.close', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.PlotWorker.submit': ('parallel.html#plotworker.submit', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel._data_parallel_worker': ('parallel.html#_data_parallel_worker', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel._free_port': ('parallel.html#_free_port', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel._from_bytes': ('parallel.html#_from_bytes', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel._hold_out_job': ('parallel.html#_hold_out_job', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel._plot_worker': ('parallel.html#_plot_worker', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel._to_bytes': ('parallel.html#_to_bytes', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.run_data_parallel': ('parallel.html#run_data_parallel', 'MIOFlow/parallel.py'),
+                                  'MIOFlow.parallel.run_leave_one_out': ('parallel.html#run_leave_one_out', 'MIOFlow/parallel.py')},
             'MIOFlow.plots': { 'MIOFlow.plots.new_plot_comparisions': ('plots.html#new_plot_comparisions', 'MIOFlow/plots.py'),
                                'MIOFlow.plots.plot_comparision': ('plots.html#plot_comparision', 'MIOFlow/plots.py'),
                                'MIOFlow.plots.plot_gene_trends': ('plots.html#plot_gene_trends', 'MIOFlow/plots.py'),
                                'MIOFlow.plots.plot_losses': ('plots.html#plot_losses', 'MIOFlow/plots.py')},
-            'MIOFlow.train': { 'MIOFlow.train.train': ('train.html#train', 'MIOFlow/train.py'),
+            'MIOFlow.train': { 'MIOFlow.train.ConvergenceMonitor': ('train.html#convergencemonitor', 'MIOFlow/train.py'),
+                               'MIOFlow.train.ConvergenceMonitor.__init__': ('train.html#convergencemonitor.__init__', 'MIOFlow/train.py'),
+                               'MIOFlow.train.ConvergenceMonitor.converged': ( 'train.html#convergencemonitor.converged',
+                                                                               'MIOFlow/train.py'),
+                               'MIOFlow.train.ConvergenceMonitor.load_state_dict': ( 'train.html#convergencemonitor.load_state_dict',
+                                                                                     'MIOFlow/train.py'),
+                               'MIOFlow.train.ConvergenceMonitor.reset': ('train.html#convergencemonitor.reset', 'MIOFlow/train.py'),
+                               'MIOFlow.train.ConvergenceMonitor.state_dict': ( 'train.html#convergencemonitor.state_dict',
+                                                                                'MIOFlow/train.py'),
+                               'MIOFlow.train.ConvergenceMonitor.update': ('train.html#convergencemonitor.update', 'MIOFlow/train.py'),
+                               'MIOFlow.train.EmbeddingCache': ('train.html#embeddingcache', 'MIOFlow/train.py'),
+                               'MIOFlow.train.EmbeddingCache.__init__': ('train.html#embeddingcache.__init__', 'MIOFlow/train.py'),
+                               'MIOFlow.train.EmbeddingCache.encode': ('train.html#embeddingcache.encode', 'MIOFlow/train.py'),
+                               'MIOFlow.train.EmbeddingCache.sample': ('train.html#embeddingcache.sample', 'MIOFlow/train.py'),
+                               'MIOFlow.train.EmbeddingCache.version': ('train.html#embeddingcache.version', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory': ('train.html#losshistory', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.__getitem__': ('train.html#losshistory.__getitem__', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.__init__': ('train.html#losshistory.__init__', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.__len__': ('train.html#losshistory.__len__', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory._series': ('train.html#losshistory._series', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.append': ('train.html#losshistory.append', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.batch_losses': ('train.html#losshistory.batch_losses', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.extend': ('train.html#losshistory.extend', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.flush': ('train.html#losshistory.flush', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.globe_losses': ('train.html#losshistory.globe_losses', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.interleave_reverse': ( 'train.html#losshistory.interleave_reverse',
+                                                                                 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.keys': ('train.html#losshistory.keys', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.load': ('train.html#losshistory.load', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.load_state_dict': ('train.html#losshistory.load_state_dict', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.local_losses': ('train.html#losshistory.local_losses', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.state_dict': ('train.html#losshistory.state_dict', 'MIOFlow/train.py'),
+                               'MIOFlow.train.LossHistory.update': ('train.html#losshistory.update', 'MIOFlow/train.py'),
+                               'MIOFlow.train._CheckpointWriter': ('train.html#_checkpointwriter', 'MIOFlow/train.py'),
+                               'MIOFlow.train._CheckpointWriter.__init__': ('train.html#_checkpointwriter.__init__', 'MIOFlow/train.py'),
+                               'MIOFlow.train._CheckpointWriter._write': ('train.html#_checkpointwriter._write', 'MIOFlow/train.py'),
+                               'MIOFlow.train._CheckpointWriter.wait': ('train.html#_checkpointwriter.wait', 'MIOFlow/train.py'),
+                               'MIOFlow.train._CheckpointWriter.write': ('train.html#_checkpointwriter.write', 'MIOFlow/train.py'),
+                               'MIOFlow.train._LossLedger': ('train.html#_lossledger', 'MIOFlow/train.py'),
+                               'MIOFlow.train._LossLedger.__init__': ('train.html#_lossledger.__init__', 'MIOFlow/train.py'),
+                               'MIOFlow.train._LossLedger.flush': ('train.html#_lossledger.flush', 'MIOFlow/train.py'),
+                               'MIOFlow.train._LossLedger.record': ('train.html#_lossledger.record', 'MIOFlow/train.py'),
+                               'MIOFlow.train._Prefetcher': ('train.html#_prefetcher', 'MIOFlow/train.py'),
+                               'MIOFlow.train._Prefetcher.__init__': ('train.html#_prefetcher.__init__', 'MIOFlow/train.py'),
+                               'MIOFlow.train._Prefetcher.__iter__': ('train.html#_prefetcher.__iter__', 'MIOFlow/train.py'),
+                               'MIOFlow.train._Prefetcher._run': ('train.html#_prefetcher._run', 'MIOFlow/train.py'),
+                               'MIOFlow.train._ae_losses': ('train.html#_ae_losses', 'MIOFlow/train.py'),
+                               'MIOFlow.train._all_ranks_mean': ('train.html#_all_ranks_mean', 'MIOFlow/train.py'),
+                               'MIOFlow.train._format_nfe': ('train.html#_format_nfe', 'MIOFlow/train.py'),
+                               'MIOFlow.train._member_sum': ('train.html#_member_sum', 'MIOFlow/train.py'),
+                               'MIOFlow.train._record_nfe': ('train.html#_record_nfe', 'MIOFlow/train.py'),
+                               'MIOFlow.train._snapshot': ('train.html#_snapshot', 'MIOFlow/train.py'),
+                               'MIOFlow.train._train_ae_epochs': ('train.html#_train_ae_epochs', 'MIOFlow/train.py'),
+                               'MIOFlow.train.train': ('train.html#train', 'MIOFlow/train.py'),
                                'MIOFlow.train.train_ae': ('train.html#train_ae', 'MIOFlow/train.py'),
                                'MIOFlow.train.training_regimen': ('train.html#training_regimen', 'MIOFlow/train.py')},
-            'MIOFlow.utils': { 'MIOFlow.utils.config_criterion': ('utils.html#config_criterion', 'MIOFlow/utils.py'),
+            'MIOFlow.utils': { 'MIOFlow.utils._CompiledFn': ('utils.html#_compiledfn', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils._CompiledFn.__call__': ('utils.html#_compiledfn.__call__', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils._CompiledFn.__getstate__': ('utils.html#_compiledfn.__getstate__', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils._CompiledFn.__init__': ('utils.html#_compiledfn.__init__', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils._CompiledFn.__setstate__': ('utils.html#_compiledfn.__setstate__', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils._compiler_errors': ('utils.html#_compiler_errors', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils.compile_fn': ('utils.html#compile_fn', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils.config_criterion': ('utils.html#config_criterion', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.config_hold_out': ('utils.html#config_hold_out', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.generate_steps': ('utils.html#generate_steps', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.get_cell_types_from_df': ('utils.html#get_cell_types_from_df', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.get_groups_from_df': ('utils.html#get_groups_from_df', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils.get_rng_states': ('utils.html#get_rng_states', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.get_sample_n_from_df': ('utils.html#get_sample_n_from_df', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.get_times_from_groups': ('utils.html#get_times_from_groups', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.group_extract': ('utils.html#group_extract', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.sample': ('utils.html#sample', 'MIOFlow/utils.py'),
+                               'MIOFlow.utils.set_rng_states': ('utils.html#set_rng_states', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.set_seeds': ('utils.html#set_seeds', 'MIOFlow/utils.py'),
                                'MIOFlow.utils.to_np': ('utils.html#to_np', 'MIOFlow/utils.py')}}}
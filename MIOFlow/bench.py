@@ -0,0 +1,320 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/11_bench.ipynb.
+
+# %% auto 0
+__all__ = ['time_per_call', 'benchmark_odes', 'benchmark_models', 'benchmark_sde_solvers', 'peak_memory', 'tune_sample_size',
+           'SampleSizeCurriculum']
+
+# %% ../nbs/11_bench.ipynb 3
+import time, itertools, copy
+import numpy as np, pandas as pd
+import torch
+
+from .utils import sample
+from .losses import MMD_loss
+
+def time_per_call(fn, n_repeats=100, n_warmup=10):
+    '''
+    Arguments:
+    ----------
+        fn (Callable): function without arguments to time.
+        n_repeats (int): Defaults to `100`. Number of timed calls.
+        n_warmup (int): Defaults to `10`. Number of calls before timing, e.g. for caches and compilation.
+    Returns:
+    ----------
+        seconds (float): the median wall time of one call.
+    '''
+    for _ in range(n_warmup):
+        fn()
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def benchmark_odes(
+    models, feature_dims=[5, 20, 100], layers=[[64], [64, 64], [256, 256]], 
+    batch_size=100, n_repeats=200, grad=False, seed=0
+):
+    '''
+    Notes:
+    ----------
+        - The parameters of the first model are loaded in the others, so they should share the same
+            state dict (e.g. `ToyODE` and `FusedToyODE`), `max_abs_diff` is then their difference 
+            with the first model.
+    Arguments:
+    ----------
+        models (dict): `{name: constructor}` where `constructor(feature_dims, layers)` returns 
+            a vector field `f(t, x)`.
+        feature_dims (list of int): Defaults to `[5, 20, 100]`. The `feature_dims` to benchmark.
+        layers (list of list of int): Defaults to `[[64], [64, 64], [256, 256]]`. The `layers` to benchmark.
+        batch_size (int): Defaults to `100`. Number of cells in the state.
+        n_repeats (int): Defaults to `200`. Number of timed evaluations.
+        grad (bool): Defaults to `False`. Whether or not to also time the backward pass.
+        seed (int): Defaults to `0`.
+    Returns:
+    ----------
+        results (pd.DataFrame): the median time per function evaluation (`us_per_nfe`) of each model 
+            and setting.
+    '''
+    results = []
+    for dims, hidden in itertools.product(feature_dims, layers):
+        torch.manual_seed(seed)
+        x = torch.randn(batch_size, dims, requires_grad=grad)
+        t = torch.tensor(0.5)
+        reference = None
+        for name, constructor in models.items():
+            func = constructor(dims, hidden)
+            if reference is None:
+                reference = func
+            else:
+                func.load_state_dict(reference.state_dict())
+            def evaluate():
+                if grad:
+                    func(t, x).sum().backward()
+                else:
+                    with torch.no_grad():
+                        func(t, x)
+            with torch.no_grad():
+                diff = (func(t, x) - reference(t, x)).abs().max().item()
+            results.append({
+                'model': name, 'feature_dims': dims, 'layers': str(hidden), 'batch_size': batch_size, 
+                'us_per_nfe': 1e6 * time_per_call(evaluate, n_repeats), 'max_abs_diff': diff
+            })
+    return pd.DataFrame(results)
+
+def benchmark_models(
+    models, feature_dims=[5, 20, 100], layers=[[64], [64, 64], [256, 256]], 
+    batch_size=100, n_steps=20, n_repeats=20, grad=False, seed=0
+):
+    '''
+    Arguments:
+    ----------
+        models (dict): `{name: constructor}` where `constructor(feature_dims, layers)` returns 
+            a model `model(x, t)`, e.g. from `make_model`.
+        feature_dims (list of int): Defaults to `[5, 20, 100]`. The `feature_dims` to benchmark.
+        layers (list of list of int): Defaults to `[[64], [64, 64], [256, 256]]`. The `layers` to benchmark.
+        batch_size (int): Defaults to `100`. Number of cells in the state.
+        n_steps (int): Defaults to `20`. Number of time steps of each solve (for fixed grid solvers).
+        n_repeats (int): Defaults to `20`. Number of timed solves.
+        grad (bool): Defaults to `False`. Whether or not to also time the backward pass.
+        seed (int): Defaults to `0`.
+    Returns:
+    ----------
+        results (pd.DataFrame): the median time per solver step (`us_per_step`) of each model and setting,
+            the compilation time is excluded by warming up.
+    '''
+    results = []
+    t = torch.linspace(0, 1, n_steps + 1)
+    for dims, hidden in itertools.product(feature_dims, layers):
+        torch.manual_seed(seed)
+        x = torch.randn(batch_size, dims, requires_grad=grad)
+        for name, constructor in models.items():
+            model = constructor(dims, hidden)
+            def solve():
+                if grad:
+                    model(x, t).sum().backward()
+                else:
+                    with torch.no_grad():
+                        model(x, t)
+            results.append({
+                'model': name, 'feature_dims': dims, 'layers': str(hidden), 'batch_size': batch_size, 
+                'us_per_step': 1e6 * time_per_call(solve, n_repeats, n_warmup=3) / n_steps
+            })
+    return pd.DataFrame(results)
+
+def benchmark_sde_solvers(
+    model, df, groups, solvers, reference={'dt': 1e-3}, 
+    sample_size=(100, ), n_samples=10, n_repeats=5, seed=0, tol=1e-5
+):
+    '''
+    Notes:
+    ----------
+        - Every solver samples the trajectories of the same cells of the first group, driven by the same 
+            (seeded) Brownian motion resolved to `tol`, and is compared with the `reference` solver at the 
+            time points `groups`. The timings use the default (faster) Brownian tree.
+        - `strong_error` is the mean distance between the paths and the reference paths, it is only defined 
+            when both use the same Levy area approximation ('"srk"' uses a different Brownian tree), otherwise NaN.
+        - `mmd` is the mean over the time points of the MMD between the samples and the reference samples.
+    Arguments:
+    ----------
+        model (ToySDEModel): the SDE, e.g. trained on `df`. Its solver configuration is not changed.
+        df (pd.DataFrame): the DataFrame from which to sample the initial cells, e.g. a toy dataset.
+        groups (list): the time points.
+        solvers (dict): `{name: config}` where `config` holds the arguments of `ToySDEModel.set_solver`,
+            e.g. `{'method': 'milstein', 'dt': 0.05}`.
+        reference (dict): Defaults to `{'dt': 1e-3}`. Configuration of the reference solver.
+        sample_size (tuple): Defaults to `(100, )`. Number of initial cells.
+        n_samples (int): Defaults to `10`. Number of trajectories per cell.
+        n_repeats (int): Defaults to `5`. Number of timed solves.
+        seed (int): Defaults to `0`.
+        tol (float): Defaults to `1e-5`. Tolerance of the Brownian motion, smaller than the steps of the solvers.
+    Returns:
+    ----------
+        results (pd.DataFrame): the median time per solve (`ms_per_call`), the drift evaluations per solve 
+            (`nfe`, if `model.func` can be profiled, see `ToyODE`) and the errors of each solver.
+    '''
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    x = sample(df, groups[0], size=sample_size, to_torch=True)
+    x = x.to(next(model.parameters()).device)
+    t = torch.Tensor(groups).to(x)
+    mmd = MMD_loss()
+
+    def configure(config):
+        # NOTE: a shallow copy shares the networks of model
+        return copy.copy(model).set_solver(**config)
+
+    with torch.no_grad():
+        ref = configure(reference)
+        ys_ref = ref.sample(x, t, n_samples, seed=seed, tol=tol)
+        results = []
+        for name, config in solvers.items():
+            solver = configure(config)
+            solve = lambda: solver.sample(x, t, n_samples, seed=seed)
+            ys = solver.sample(x, t, n_samples, seed=seed, tol=tol)
+            if solver._levy_area_approximation() == ref._levy_area_approximation():
+                strong_error = (ys - ys_ref).norm(dim=-1).mean().item()
+            else:
+                strong_error = float('nan')
+            weak_error = np.mean([
+                mmd(ys[:, i].flatten(0, 1), ys_ref[:, i].flatten(0, 1)).item() for i in range(1, len(t))
+            ])
+            nfe = float('nan')
+            if hasattr(model.func, 'reset_nfe'):
+                profile = model.func.profile
+                model.func.profile = True
+                model.func.reset_nfe()
+                solve()
+                nfe = model.func.nfe['forward']
+                model.func.profile = profile
+                model.func.reset_nfe()
+            results.append({
+                'solver': name, 'method': solver.method, 'dt': solver.dt, 'adaptive': solver.adaptive,
+                'ms_per_call': 1e3 * time_per_call(solve, n_repeats, n_warmup=1), 'nfe': nfe,
+                'strong_error': strong_error, 'mmd': weak_error
+            })
+    return pd.DataFrame(results)
+
+# %% ../nbs/11_bench.ipynb 4
+import os, threading
+from .utils import get_rng_states, set_rng_states
+from .train import train
+
+def _rss_mb():
+    '''
+    The resident set size of the process in MB, `None` where `/proc` is not available.
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_memory(fn, use_cuda=False, interval=0.005):
+    '''
+    Arguments:
+    ----------
+        fn (Callable): function without arguments to run.
+        use_cuda (bool): Defaults to `False`. Whether to measure the allocated CUDA memory instead of the RSS.
+        interval (float): Defaults to `0.005`. The seconds between two samples of the RSS.
+    Returns:
+    ----------
+        result: the return value of `fn()`.
+        peak_mb (float|NoneType): the peak memory added by the call (MB), i.e. above the memory of the process 
+            just before it, `None` if it cannot be measured.
+    '''
+    if use_cuda:
+        torch.cuda.reset_peak_memory_stats()
+        start = torch.cuda.memory_allocated()
+        result = fn()
+        return result, (torch.cuda.max_memory_allocated() - start) / 2**20
+    start = _rss_mb()
+    if start is None:
+        return fn(), None
+    peak, done = [start], threading.Event()
+    def sample_rss():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], _rss_mb())
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    try:
+        result = fn()
+    finally:
+        done.set()
+        sampler.join()
+    return result, max(peak[0], _rss_mb()) - start
+
+def tune_sample_size(
+    model, df, groups, optimizer, time_budget=None, memory_budget=None,
+    min_size=16, max_size=None, growth=2, n_batches=3, **train_kwargs
+):
+    '''
+    Notes:
+    ----------
+        - Probes `n_batches` of `train` (after one warmup batch) at the sizes `min_size`, `min_size * growth`, ...
+            up to `max_size`, and stops at the first size over a budget. The probes train copies of `model` 
+            and `optimizer`, and the RNG states are restored afterwards.
+        - The memory is the peak added by the probe over the memory of the process before it (its RSS, or the 
+            allocated CUDA memory with `use_cuda`), so it does not depend on what is already loaded.
+    Arguments:
+    ----------
+        model, df, groups, optimizer, train_kwargs: the arguments of `train`.
+        time_budget (float|NoneType): Defaults to `None`. The maximum seconds per batch.
+        memory_budget (float|NoneType): Defaults to `None`. The maximum peak memory (MB) added by the training
+            of a sample size, see `peak_memory`.
+        min_size (int): Defaults to `16`. The first size probed.
+        max_size (int|NoneType): Defaults to `None`. The last size probed, the size of the smallest group
+            if `None` (without `sample_with_replacement`) or `100 * min_size`.
+        growth (float): Defaults to `2`. The ratio between two sizes probed.
+        n_batches (int): Defaults to `3`. The number of timed batches per size.
+    Returns:
+    ----------
+        sample_size (tuple): the largest `(size, )` within the budgets, `(min_size, )` if there is none.
+        results (pd.DataFrame): the seconds per batch (`s_per_batch`) and peak memory (`peak_mb`) of each size probed.
+    '''
+    if time_budget is None and memory_budget is None:
+        raise ValueError('At least one of time_budget and memory_budget is required.')
+    if max_size is None:
+        max_size = 100 * min_size
+        if not train_kwargs.get('sample_with_replacement', False):
+            max_size = min(max_size, int(df.groupby('samples').size().min()))
+    use_cuda = train_kwargs.get('use_cuda', False)
+
+    rng_states = get_rng_states()
+    results, best, size = [], (min_size, ), min_size
+    try:
+        while size <= max_size:
+            probe_model, probe_optimizer = copy.deepcopy((model, optimizer))
+            def probe(n):
+                return train(probe_model, df, groups, probe_optimizer, n, sample_size=(size, ), **train_kwargs)
+            probe(1)
+            start = time.perf_counter()
+            _, peak_mb = peak_memory(lambda: probe(n_batches), use_cuda=use_cuda)
+            s_per_batch = (time.perf_counter() - start) / n_batches
+            within = (
+                (time_budget is None or s_per_batch <= time_budget) 
+                and (memory_budget is None or peak_mb is None or peak_mb <= memory_budget)
+            )
+            results.append(dict(sample_size=size, s_per_batch=s_per_batch, peak_mb=peak_mb, within_budget=within))
+            if not within:
+                break
+            best = (size, )
+            size = max(size + 1, int(round(size * growth)))
+    finally:
+        set_rng_states(rng_states)
+    return best, pd.DataFrame(results)
+
+class SampleSizeCurriculum:
+    '''
+    A `sample_size` for `training_regimen` growing geometrically from `start` to `end` over the first 
+    `n_epochs` epochs (of all the phases), then `end`.
+    '''
+    def __init__(self, start, end, n_epochs):
+        self.start = start[0] if isinstance(start, tuple) else start
+        self.end = end[0] if isinstance(end, tuple) else end
+        self.n_epochs = n_epochs
+
+    def __call__(self, epoch):
+        progress = min(epoch / max(self.n_epochs - 1, 1), 1)
+        return (int(round(self.start * (self.end / self.start) ** progress)), )
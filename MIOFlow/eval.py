@@ -2,7 +2,8 @@
 
 # %% auto 0
 __all__ = ['generate_points', 'generate_trajectories', 'generate_plot_data', 'get_points_from_trajectories', 'calculate_nn',
-           'generate_tjnet_trajectories', 'get_cell_indexes']
+           'generate_tjnet_trajectories', 'get_cell_indexes', 'compute_jacobians', 'compute_trajectory_jacobians',
+           'project_jacobians']
 
 # %% ../nbs/10_eval.ipynb 3
 import torch, numpy as np
@@ -11,7 +12,7 @@ from .utils import sample, to_np
 def generate_points(
     model, df, n_points=100, 
     sample_with_replacement=False, use_cuda=False, 
-    samples_key='samples', sample_time=None, autoencoder=None, recon=False
+    samples_key='samples', sample_time=None, autoencoder=None, recon=False, dense=False, step_size=None
 ):
     '''
     Arguments:
@@ -28,6 +29,10 @@ def generate_points(
             timepoints as specified in the column `df[samples_key]`.
         autoencoder (nn.Module|NoneType): Default to None, the trained autoencoder.
         recon (bool): Default to 'False', whether to use the autoencoder for reconstruction.
+        dense (bool): Defaults to `False`. Whether or not to solve only on the timepoint groups and interpolate
+            the solution at `sample_time` (see `ToyModel.dense_forward`), instead of solving on `sample_time`.
+        step_size (float | NoneType): Defaults to `None`. With `dense`, the step of the fixed grid solvers,
+            the spacing of `sample_time` if `None` (i.e. the steps of the solve on `sample_time`).
     Returns:
     ----------
         generated (float[float[]]): a list with shape `(len(sample_time), n_points, len(df.columns) - 1)`
@@ -47,14 +52,26 @@ def generate_points(
         data_t0 = autoencoder.encoder(data_t0)
         
     time =  torch.Tensor(sample_time).cuda() if use_cuda else torch.Tensor(sample_time)
-    generated = model(data_t0, time, return_whole_sequence=True)
+    if dense:
+        solve_time = torch.Tensor(groups).to(time)
+        generated = model.dense_forward(data_t0, solve_time, _dense_step(sample_time, step_size))(time)
+    else:
+        generated = model(data_t0, time, return_whole_sequence=True)
     if autoencoder is not None and recon:
         generated = autoencoder.decoder(generated)
     return to_np(generated)
 
+def _dense_step(sample_time, step_size=None):
+    # NOTE: by default the fixed grid solvers take the steps of a solve on `sample_time`, 
+    #   on the timepoint groups alone they would take one step per group
+    if step_size is not None or len(sample_time) < 2:
+        return step_size
+    return float(np.min(np.abs(np.diff(to_np(torch.as_tensor(sample_time))))))
+
 def generate_trajectories(
     model, df, n_trajectories=30, n_bins=100, 
-    sample_with_replacement=False, use_cuda=False, samples_key='samples',autoencoder=None, recon=False
+    sample_with_replacement=False, use_cuda=False, samples_key='samples',autoencoder=None, recon=False, dense=False,
+    step_size=None
 ):
     '''
     Arguments:
@@ -70,6 +87,10 @@ def generate_trajectories(
         samples_key (str): Defaults to `'samples'`. The column in the `df` which has the timepoint groups.
         autoencoder (nn.Module|NoneType): Default to None, the trained autoencoder.
         recon (bool): Default to 'False', whether to use the autoencoder for reconstruction.
+        dense (bool): Defaults to `False`. Whether or not to interpolate the `n_bins` from a solution on the
+            timepoint groups. See `generate_points`.
+        step_size (float | NoneType): Defaults to `None`. With `dense`, the step of the fixed grid solvers,
+            the spacing of the `n_bins` if `None`. See `generate_points`.
     Returns:
     ----------
         trajectories (float[float[]]): a list with shape `(n_bins, n_points, len(df.columns) - 1)`
@@ -77,13 +98,13 @@ def generate_trajectories(
     '''
     groups = sorted(df[samples_key].unique())
     sample_time = np.linspace(np.min(groups), np.max(groups), n_bins)
-    trajectories = generate_points(model, df, n_trajectories, sample_with_replacement, use_cuda, samples_key, sample_time,autoencoder=autoencoder, recon=recon)
+    trajectories = generate_points(model, df, n_trajectories, sample_with_replacement, use_cuda, samples_key, sample_time,autoencoder=autoencoder, recon=recon, dense=dense, step_size=step_size)
     return trajectories
     
 def generate_plot_data(
     model, df, n_points, n_trajectories, n_bins, 
     sample_with_replacement=False, use_cuda=False, samples_key='samples',
-    logger=None, autoencoder=None, recon=False
+    logger=None, autoencoder=None, recon=False, dense=False, step_size=None
 ):
     '''
     Arguments:
@@ -100,6 +121,8 @@ def generate_plot_data(
         samples_key (str): Defaults to `'samples'`. The column in the `df` which has the timepoint groups.
         autoencoder (nn.Module|NoneType): Default to None, the trained autoencoder.
         recon (bool): Default to 'False', whether to use the autoencoder for reconstruction.
+        dense (bool): Defaults to `False`. Whether or not to interpolate the trajectories, see `generate_trajectories`.
+        step_size (float | NoneType): Defaults to `None`. With `dense`, see `generate_trajectories`.
     Returns:
     ----------
         points (float[float[]]): a list with shape `(len(df[sample_key].unique()), n_points, len(df.columns) - 1)`
@@ -110,7 +133,7 @@ def generate_plot_data(
     if logger: logger.info(f'Generating points')
     points = generate_points(model, df, n_points, sample_with_replacement, use_cuda, samples_key, None, autoencoder=autoencoder, recon=recon)
     if logger: logger.info(f'Generating trajectories')
-    trajectories = generate_trajectories(model, df, n_trajectories, n_bins, sample_with_replacement, use_cuda, samples_key, autoencoder=autoencoder, recon=recon)
+    trajectories = generate_trajectories(model, df, n_trajectories, n_bins, sample_with_replacement, use_cuda, samples_key, autoencoder=autoencoder, recon=recon, dense=dense, step_size=step_size)
     return points, trajectories
 
 # %% ../nbs/10_eval.ipynb 4
@@ -281,7 +304,7 @@ from MIOFlow.utils import (
 import seaborn as sns
 def generate_tjnet_trajectories(
     model, df, n_bins=10, use_cuda=False, samples_key='samples', 
-    autoencoder=None, recon=False, where='end', start=0
+    autoencoder=None, recon=False, where='end', start=0, dense=False, step_size=None
 ):
     '''
     Arguments:
@@ -312,6 +335,12 @@ def generate_tjnet_trajectories(
             This is used if attempting to generate outside of `t0`. Note this works relative to `where`.
             E.g. if `where="end"` and `start=0` then this is the same as `groups[-1]`.
 
+        dense (bool): Defaults to `False`. Whether or not to solve only on the timepoints and interpolate
+            the `len(times) * n_bins` points (see `ToyModel.dense_forward`).
+
+        step_size (float | NoneType): Defaults to `None`. With `dense`, the step of the fixed grid solvers,
+            the spacing of the `len(times) * n_bins` points if `None`.
+
     Returns:
     -----------
         trajectories (np.ndarray): Trajectories with shape (time, cells, dimensions)
@@ -350,7 +379,11 @@ def generate_tjnet_trajectories(
     if autoencoder is not None and recon:
         data_tn = autoencoder.encoder(data_tn)
 
-    generated = model(data_tn, sample_time, return_whole_sequence=True)
+    if dense:
+        solve_time = torch.Tensor(times).to(sample_time)
+        generated = model.dense_forward(data_tn, solve_time, _dense_step(sample_time, step_size))(sample_time)
+    else:
+        generated = model(data_tn, sample_time, return_whole_sequence=True)
     if autoencoder is not None and recon:
         generated = autoencoder.decoder(generated)
     generated = to_np(generated)
@@ -528,3 +561,99 @@ def get_cell_indexes(
             
         
     return genes, top_idxs, inverse, colors
+
+# %% ../nbs/10_eval.ipynb 6
+from torch.func import vmap, jacrev
+
+def compute_jacobians(model, x, t, chunk_size=1024, use_cuda=False):
+    '''
+    Arguments:
+    ----------
+        model (nn.Module): Trained model with the vector field `model.func` (e.g. `ToyModel`), or the 
+            vector field `func(t, x)` itself (e.g. `ToyODE`).
+        x (np.ndarray | torch.Tensor): The cells with shape `(n_cells, dimensions)`.
+        t (float | np.ndarray | torch.Tensor): The time of evaluation, either a single time or one per cell.
+        chunk_size (int | NoneType): Defaults to `1024`. Number of cells whose Jacobians are computed together,
+            bounding the memory for large sets of cells. If `None` all the cells at once.
+        use_cuda (bool): Defaults to `False`. Whether or not to use cuda.
+    Returns:
+    ----------
+        jacobians (np.ndarray): The Jacobians of the vector field with respect to x, with shape 
+            `(n_cells, dimensions, dimensions)` where `jacobians[:, i, j]` is `d(dx_i/dt)/dx_j`.
+    '''
+    func = getattr(model, 'func', model)
+    x = torch.as_tensor(x).float()
+    t = torch.as_tensor(t).float().reshape(-1).expand(x.shape[0])
+    if use_cuda:
+        x, t = x.cuda(), t.cuda()
+
+    def field(t_i, x_i):
+        return func(t_i, x_i.unsqueeze(0)).squeeze(0)
+    # NOTE: one reverse-mode Jacobian per cell, vectorized over the cells of a chunk
+    batched_jacobian = vmap(jacrev(field, argnums=1), randomness='different')
+
+    chunk_size = x.shape[0] if chunk_size is None else chunk_size
+    jacobians = [
+        to_np(batched_jacobian(t_chunk, x_chunk))
+        for t_chunk, x_chunk in zip(t.split(chunk_size), x.split(chunk_size))
+    ]
+    return np.concatenate(jacobians)
+
+def compute_trajectory_jacobians(model, trajectories, times, chunk_size=1024, use_cuda=False):
+    '''
+    Arguments:
+    ----------
+        model (nn.Module): See `compute_jacobians`.
+        trajectories (np.ndarray): Trajectories with shape `(time, cells, dimensions)`, e.g. from 
+            `generate_trajectories` or `generate_tjnet_trajectories`.
+        times (np.ndarray | list): The time of each step of `trajectories`.
+        chunk_size (int | NoneType): Defaults to `1024`. See `compute_jacobians`.
+        use_cuda (bool): Defaults to `False`. Whether or not to use cuda.
+    Returns:
+    ----------
+        jacobians (np.ndarray): The Jacobians along the trajectories, with shape 
+            `(time, cells, dimensions, dimensions)`.
+    '''
+    n_times, n_cells, n_dims = trajectories.shape
+    times = np.repeat(np.asarray(times, dtype=np.float32), n_cells)
+    jacobians = compute_jacobians(
+        model, trajectories.reshape(-1, n_dims), times, chunk_size=chunk_size, use_cuda=use_cuda
+    )
+    return jacobians.reshape(n_times, n_cells, n_dims, n_dims)
+
+def project_jacobians(jacobians, principal_components, df=None, genes=None):
+    '''
+    Notes:
+    -----------
+        - As in `get_cell_indexes`, the gene space is reconstructed as `x @ principal_components`, so the
+            Jacobian in gene space is `principal_components.T @ J @ principal_components`, and entry `[a, b]`
+            is the effect of gene `b` on the velocity of gene `a`.
+
+    Arguments:
+    -----------
+        jacobians (np.ndarray): Jacobians with shape `(..., dimensions, dimensions)`, see `compute_jacobians`.
+
+        principal_components (np.ndarray): The principle components with shape (dimensions, n_genes).
+            If used phate, can be obtained from `phate_operator.graph.data_pca.components_`
+
+        df (pd.DataFrame | NoneType): Defaults to `None`. DataFrame whose gene columns correspond to the 
+            columns of `principal_components`, see `get_cell_indexes`. Required with `genes`.
+
+        genes (np.ndarray | list | NoneType): Defaults to `None`. Genes of interest, all genes if `None`.
+
+    Returns:
+    -----------
+        genes (np.ndarray | NoneType): The genes in order of the columns of `df`, `None` if no `genes`
+            were passed.
+
+        gene_jacobians (np.ndarray): The Jacobians in gene space with shape `(..., n_genes, n_genes)`.
+    '''
+    if genes is not None:
+        if df is None:
+            raise ValueError('`df` is required to select `genes`')
+        # Filter for only known genes, in order
+        genes_mask = df.columns.isin(genes)
+        genes = df.columns[genes_mask]
+        principal_components = principal_components[:, genes_mask]
+    gene_jacobians = np.einsum('da,...de,eb->...ab', principal_components, jacobians, principal_components)
+    return genes, gene_jacobians
@@ -1,8 +1,8 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/08_exp.ipynb.
 
 # %% auto 0
-__all__ = ['config_exp_logger', 'exp_log_filename', 'exp_param_filename', 'list_exps', 'gen_exp_name', 'load_exp_params',
-           'save_exp_params', 'setup_exp', 'is_config_subset', 'find_exps', 'test_exp']
+__all__ = ['config_exp_logger', 'exp_log_filename', 'exp_param_filename', 'exp_checkpoint_filename', 'list_exps', 'gen_exp_name',
+           'load_exp_params', 'save_exp_params', 'setup_exp', 'is_config_subset', 'find_exps', 'test_exp']
 
 # %% ../nbs/08_exp.ipynb 3
 import os, datetime, yaml
@@ -56,6 +56,18 @@ def exp_param_filename(path):
     '''
     return os.path.join(path, 'params.yml')
 
+def exp_checkpoint_filename(path):
+    '''
+    Arguments:
+    ----------
+        path (str): full path to experiment, i.e. 
+            `<path-to-experiments-dir>/<experiment-timestamp>`
+    Returns:
+    ----------
+        checkpoint_file (str): full path to provided experiment's training checkpoint
+    '''
+    return os.path.join(path, 'checkpoint.pt')
+
 def list_exps(path):
     '''
     Notes:
@@ -1,7 +1,8 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/09_geo.ipynb.
 
 # %% auto 0
-__all__ = ['DiffusionDistance', 'DiffusionAffinity', 'DiffusionMap', 'PhateDistance', 'old_DiffusionDistance', 'setup_distance']
+__all__ = ['DiffusionDistance', 'DiffusionAffinity', 'DiffusionMap', 'PhateDistance', 'old_DiffusionDistance', 'setup_distance',
+           'PrecomputedDistance']
 
 # %% ../nbs/09_geo.ipynb 3
 import graphtools
@@ -281,3 +282,64 @@ def setup_distance(
             f'Please see {_valid_distance_types}'
         )
     return dist
+
+# %% ../nbs/09_geo.ipynb 10
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+
+class PrecomputedDistance:
+    """
+    The distances of `dist` between the cells of `df`, fitted once, for `train_ae` to index the distances
+    between the cells it samples (see `take`) instead of fitting `dist` on them every epoch.
+
+    Arguments
+    ---------
+        dist: the distance, with a `fit(X)` method returning the pairwise distances in `X`, e.g. from `setup_distance`.
+        df (pd.DataFrame): the data, with a column `samples_key` of timepoints.
+        n_landmarks (int|NoneType): Defaults to `None`. If `None`, `dist` is fitted on all the cells 
+            (a dense `(n_cells, n_cells)` matrix). Otherwise on `n_landmarks` cells sampled at random,
+            and the distance between two cells interpolates those between their `n_neighbors` nearest landmarks.
+        n_neighbors (int): Defaults to `3`. The landmarks of each cell, weighted by inverse euclidean distance.
+        samples_key (str): Defaults to `'samples'`.
+    """
+
+    def __init__(self, dist, df, n_landmarks=None, n_neighbors=3, samples_key='samples') -> None:
+        X = df.drop(columns=samples_key).values
+        self.n_landmarks = n_landmarks
+        if n_landmarks is None or n_landmarks >= X.shape[0]:
+            self.G = self._square(dist.fit(X))
+            self.W = None
+            return
+        self.landmarks = np.random.choice(X.shape[0], size=n_landmarks, replace=False)
+        self.G = self._square(dist.fit(X[self.landmarks]))
+        n_neighbors = min(n_neighbors, n_landmarks)
+        distances, neighbors = NearestNeighbors(n_neighbors=n_neighbors).fit(X[self.landmarks]).kneighbors(X)
+        # NOTE: a cell which is a landmark (distance 0) takes all the weight of that landmark
+        weights = 1 / np.maximum(distances, 1e-12)
+        self.W = (weights / weights.sum(axis=1, keepdims=True), neighbors)
+
+    @staticmethod
+    def _square(G):
+        G = np.asarray(G)
+        return squareform(G) if G.ndim == 1 else G
+
+    def take(self, idx):
+        """
+        Parameters
+        ----------
+            idx: (np.array) positional indices of cells of `df`.
+        
+        Returns
+        -------
+        np.array
+            the `(len(idx), len(idx))` distances between these cells.
+        """
+        idx = np.asarray(idx)
+        if self.W is None:
+            return self.G[np.ix_(idx, idx)]
+        weights, neighbors = self.W[0][idx], self.W[1][idx]
+        # G_ij = sum_ab w_ia w_jb G[n_ia, n_jb]
+        G = np.einsum('ia,iam->im', weights, self.G[neighbors])
+        G = np.einsum('jb,ijb->ij', weights, G[:, neighbors])
+        G[idx[:, None] == idx[None]] = 0
+        return G
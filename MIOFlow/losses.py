@@ -20,28 +20,31 @@ class MMD_loss(nn.Module):
         return
     
     def guassian_kernel(self, source, target, kernel_mul=2.0, kernel_num=5, fix_sigma=None):
-        n_samples = int(source.size()[0])+int(target.size()[0])
-        total = torch.cat([source, target], dim=0)
-        total0 = total.unsqueeze(0).expand(int(total.size(0)), int(total.size(0)), int(total.size(1)))
-        total1 = total.unsqueeze(1).expand(int(total.size(0)), int(total.size(0)), int(total.size(1)))
-        L2_distance = ((total0-total1)**2).sum(2) 
+        # NOTE: the leading dimensions (if any) index independent pairs of source and target
+        n_samples = int(source.size()[-2])+int(target.size()[-2])
+        total = torch.cat([source, target], dim=-2)
+        L2_distance = ((total.unsqueeze(-3)-total.unsqueeze(-2))**2).sum(-1) 
         if fix_sigma:
             bandwidth = fix_sigma
         else:
-            bandwidth = torch.sum(L2_distance.data) / (n_samples**2-n_samples)
+            bandwidth = torch.sum(L2_distance.data, dim=(-2, -1), keepdim=True) / (n_samples**2-n_samples)
         bandwidth /= kernel_mul ** (kernel_num // 2)
         bandwidth_list = [bandwidth * (kernel_mul**i) for i in range(kernel_num)]
         kernel_val = [torch.exp(-L2_distance / bandwidth_temp) for bandwidth_temp in bandwidth_list]
         return sum(kernel_val)
 
     def forward(self, source, target):
-        batch_size = int(source.size()[0])
+        """
+        The MMD between source and target of shape (n, d) and (m, d), or one MMD per pair for stacked pairs 
+        of shape (..., n, d) and (..., m, d).
+        """
+        batch_size = int(source.size()[-2])
         kernels = self.guassian_kernel(source, target, kernel_mul=self.kernel_mul, kernel_num=self.kernel_num, fix_sigma=self.fix_sigma)
-        XX = kernels[:batch_size, :batch_size]
-        YY = kernels[batch_size:, batch_size:]
-        XY = kernels[:batch_size, batch_size:]
-        YX = kernels[batch_size:, :batch_size]
-        loss = torch.mean(XX + YY - XY -YX)
+        XX = kernels[..., :batch_size, :batch_size]
+        YY = kernels[..., batch_size:, batch_size:]
+        XY = kernels[..., :batch_size, batch_size:]
+        YX = kernels[..., batch_size:, :batch_size]
+        loss = torch.mean(XX + YY - XY -YX, dim=(-2, -1))
         return loss
 
 # %% ../nbs/01_losses.ipynb 4
@@ -98,6 +101,9 @@ class Density_loss(nn.Module):
                 for i in range(1,len(groups))
                 if groups[i] != to_ignore
             ])
+        elif source.dim() == 3:
+            # for the local loss of stacked pairs, one loss per pair
+            c_dist = torch.cdist(source, target)
         else:
             # for local loss
              c_dist = torch.stack([
@@ -106,6 +112,8 @@ class Density_loss(nn.Module):
         values, _ = torch.topk(c_dist, top_k, dim=2, largest=False, sorted=False)
         values -= self.hinge_value
         values[values<0] = 0
+        if groups is None and source.dim() == 3:
+            return torch.mean(values, dim=(1, 2))
         loss = torch.mean(values)
         return loss
 
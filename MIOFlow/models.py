@@ -1,13 +1,16 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/03_models.ipynb.
 
 # %% auto 0
-__all__ = ['ToyODE', 'make_model', 'Autoencoder', 'ToyModel', 'ToySDEModel']
+__all__ = ['ToyODE', 'FusedToyODE', 'EnsembleODE', 'compile_ode', 'make_model', 'Autoencoder', 'DenseTrajectory', 'ToyModel',
+           'ToySDEModel']
 
 # %% ../nbs/03_models.ipynb 3
-import itertools
+import itertools, time, copy
 from torch.nn  import functional as F 
 import torch.nn as nn
 import torch
+from torch.func import stack_module_state, functional_call, vmap
+from .utils import compile_fn
 class ToyODE(nn.Module):
     """ 
     ODE derivative network
@@ -26,6 +29,14 @@ class ToyODE(nn.Module):
         x (torch.tensor): position of the evalutation.
         Return:
         derivative at time t and position x.   
+        Note t can also hold one time per row of x.
+    
+    Profiling
+        profile (bool) default 'False': if True, counts the number of function evaluations (`nfe`), the time spent
+            in them (`nfe_time`, in seconds) and the number of solver steps (`n_steps`). Each is a dict with a
+            'forward' and an 'adjoint' entry, the entry being updated is `phase` (set by `ToyModel`).
+            Note that on GPU the times do not include the asynchronous kernel execution.
+        reset_nfe (Callable): resets the counters.
     """
     def __init__(
         self, 
@@ -50,17 +61,143 @@ class ToyODE(nn.Module):
         self.alpha = nn.Parameter(torch.tensor(scales, requires_grad=True).float()) if scales is not None else None
         self.n_aug = n_aug        
         
+        self.profile = False
+        self.reset_nfe()
+
+    def reset_nfe(self):
+        self.phase = 'forward'
+        self.nfe = {'forward': 0, 'adjoint': 0}
+        self.nfe_time = {'forward': 0., 'adjoint': 0.}
+        self.n_steps = {'forward': 0, 'adjoint': 0}
+
+    # NOTE: torchdiffeq calls these before each step of the solver, and of the adjoint solver.
+    def callback_step(self, t0, y0, dt):
+        if self.profile:
+            self.n_steps['forward'] += 1
+
+    def callback_step_adjoint(self, t0, y0, dt):
+        if self.profile:
+            self.n_steps['adjoint'] += 1
+
     def forward(self, t, x): #NOTE the forward pass when we use torchdiffeq must be forward(self,t,x)
+        if not self.profile:
+            return self._vector_field(t, x)
+        start = time.perf_counter()
+        dxdt = self._vector_field(t, x)
+        self.nfe_time[self.phase] += time.perf_counter() - start
+        self.nfe[self.phase] += 1
+        return dxdt
+
+    def _vector_field(self, t, x):
         zero = torch.tensor([0]).cuda() if x.is_cuda else torch.tensor([0])
         zeros = zero.repeat(x.size()[0],self.n_aug)
-        time = t.repeat(x.size()[0],1)
+        # NOTE: t is either a scalar or one time per row of x, see `ToyModel.shooting_forward`
+        time = t.repeat(x.size()[0],1) if t.numel() == 1 else t.reshape(-1, 1)
         aug = torch.cat((x,time,zeros),dim=1)
         x = self.seq(aug)
         if self.alpha is not None:
             z = torch.randn(x.size(),requires_grad=False).cuda() if x.is_cuda else torch.randn(x.size(),requires_grad=False)
-        dxdt = x + z*self.alpha[int(t-1)] if self.alpha is not None else x
+        dxdt = x + z*self.alpha[(time-1).long()] if self.alpha is not None else x
         return dxdt
 
+class FusedToyODE(ToyODE):
+    """ 
+    ODE derivative network, numerically equivalent to `ToyODE` (same parameters and state dict) but 
+    without building the augmented input at every evaluation.
+    
+    The first linear layer is split into the weights of x, of the time and of the augmented dimensions.
+    The time enters as a rank-1 update of the bias and, since the augmented dimensions are zeros, 
+    their weights are dropped. The noise (`scales`) is sampled on the device of x.
+    
+    See `ToyODE` for the parameters.
+    """
+    def __init__(self, *args, **kwargs):
+        super(FusedToyODE, self).__init__(*args, **kwargs)
+        # NOTE: a tuple is not registered, the layers stay (once) in `seq`
+        self._layers = tuple(self.seq)[1:]
+
+    def _vector_field(self, t, x):
+        first = self.seq[0]
+        d = x.size(1)
+        weight_x, weight_t = first.weight[:, :d], first.weight[:, d]
+        if t.numel() == 1:
+            h = torch.addmm(first.bias + t * weight_t, x, weight_x.t())
+        else:
+            h = torch.addmm(first.bias, x, weight_x.t()).addcmul_(t.reshape(-1, 1), weight_t)
+        for layer in self._layers:
+            h = layer(h)
+        if self.alpha is not None:
+            time = t.reshape(-1, 1) if t.numel() > 1 else t.reshape(1, 1)
+            h = h + torch.randn_like(h) * self.alpha[(time-1).long()]
+        return h
+
+class EnsembleODE(nn.Module):
+    """ 
+    Ensemble of ODE derivative networks of the same architecture (e.g. `ToyODE` with different seeds),
+    evaluated together by vectorizing one network over the stacked parameters of the members.
+    
+    funcs (list of nn.Module): the members, their parameters are copied (see `torch.func.stack_module_state`).
+    
+    Method
+    forward (Callable)
+        Parameters:
+        t (torch.tensor): time of the evaluation, shared by the members.
+        x (torch.tensor): position of the evaluation, of shape (n_members, n, feature_dims).
+        Return:
+        derivative of each member at time t and position x.
+    member (Callable)
+        returns the i-th member as a standalone network.
+    
+    The noise (`scales`) is sampled independently for each member. Profiling is the same as `ToyODE`,
+    counting the evaluations of the whole ensemble.
+    """
+    def __init__(self, funcs):
+        super(EnsembleODE, self).__init__()
+        params, buffers = stack_module_state(funcs)
+        self.n_members = len(funcs)
+        # NOTE: the names of the members' parameters contain dots, they are kept in order in a list instead
+        self._param_names = tuple(params)
+        self._buffer_names = tuple(buffers)
+        self.params = nn.ParameterList([nn.Parameter(params[name]) for name in self._param_names])
+        for i, name in enumerate(self._buffer_names):
+            self.register_buffer(f'buffer_{i}', buffers[name])
+        # NOTE: a tuple is not registered, the template has no data and gets the members' tensors at each call
+        self._base = (copy.deepcopy(funcs[0]).to('meta'), )
+
+        self.profile = False
+        self.reset_nfe()
+
+    reset_nfe = ToyODE.reset_nfe
+    callback_step = ToyODE.callback_step
+    callback_step_adjoint = ToyODE.callback_step_adjoint
+    forward = ToyODE.forward
+
+    def _stacked(self):
+        state = dict(zip(self._param_names, self.params))
+        state.update({name: getattr(self, f'buffer_{i}') for i, name in enumerate(self._buffer_names)})
+        return state
+
+    def _member_field(self, state, t, x):
+        return functional_call(self._base[0], state, (t, x))
+
+    def _vector_field(self, t, x):
+        return vmap(self._member_field, in_dims=(0, None, 0), randomness='different')(self._stacked(), t, x)
+
+    def member(self, i):
+        func = copy.deepcopy(self._base[0])
+        func.load_state_dict({name: value[i].detach().clone() for name, value in self._stacked().items()}, assign=True)
+        return func
+
+def compile_ode(func, **kwargs):
+    """
+    Compiles the vector field of `func` (`ToyODE` or `FusedToyODE`) in place with `torch.compile`,
+    the module, its parameters and state dict are unchanged and profiling stays in eager mode. 
+    Falls back to eager mode if compilation is unavailable or fails, see `compile_fn`.
+    kwargs are passed to `torch.compile`.
+    """
+    func._vector_field = compile_fn(func._vector_field, **kwargs)
+    return func
+
 # %% ../nbs/03_models.ipynb 4
 def make_model(
     feature_dims=5,
@@ -76,21 +213,37 @@ def make_model(
     noise_type='diagonal', sde_type='ito',
     use_norm=False,
     use_cuda=False,
-    in_features=2, out_features=2, gunc=None
+    in_features=2, out_features=2, gunc=None,
+    adjoint='auto', max_memory_mb=1024,
+    fused=False, compile=False,
+    n_members=None,
+    dt=0.1, adaptive=False,
+    log_density=False, trace='auto'
 ):
     """
     Creates the 'ode' model or 'sde' model or the Geodesic Autoencoder. 
-    See the parameters of the respective classes.
+    See the parameters of the respective classes, `fused` uses `FusedToyODE` instead of `ToyODE`
+    and `compile` compiles the solver loop or the vector field (see `ToyModel` and `compile_ode`).
+    With `n_members`, the 'ode' model solves an `EnsembleODE` of `n_members` independently initialized networks.
     """
+    ODE = FusedToyODE if fused else ToyODE
     if which == 'ode':
-        ode = ToyODE(feature_dims, layers, activation,scales,n_aug)
-        model = ToyModel(ode,method,rtol, atol, use_norm=use_norm)
+        if n_members is None:
+            ode = ODE(feature_dims, layers, activation,scales,n_aug)
+        else:
+            ode = EnsembleODE([ODE(feature_dims, layers, activation,scales,n_aug) for _ in range(n_members)])
+        model = ToyModel(
+            ode,method,rtol, atol, use_norm=use_norm, adjoint=adjoint, max_memory_mb=max_memory_mb, 
+            compile=compile, log_density=log_density, trace=trace
+        )
     elif which == 'sde':
-        ode = ToyODE(feature_dims, layers, activation,scales,n_aug)
+        ode = ODE(feature_dims, layers, activation,scales,n_aug)
+        if compile:
+            compile_ode(ode)
         model = ToySDEModel(
             ode, method, noise_type, sde_type,
-            in_features=in_features, out_features=out_features, gunc=gunc
-            
+            in_features=in_features, out_features=out_features, gunc=gunc,
+            dt=dt, adaptive=adaptive, rtol=rtol, atol=atol
         )
     else:
         model = ToyGeo(feature_dims, layers, output_dims, activation)
@@ -170,10 +323,187 @@ class Autoencoder(nn.Module):
         return self.decoder(z)
 
 # %% ../nbs/03_models.ipynb 6
-from torchdiffeq import odeint_adjoint as odeint
-import os, math, numpy as np
+from torchdiffeq import odeint, odeint_adjoint
+import os, math, logging, numpy as np
 import torch
 import torch.nn as nn
+
+_logger = logging.getLogger(__name__)
+
+# NOTE: number of vector field evaluations per step of each torchdiffeq solver
+_SOLVER_STAGES = {
+    'euler': 1, 'midpoint': 2, 'heun2': 2, 'heun3': 3, 'rk4': 4, 'explicit_adams': 1,
+    'implicit_adams': 1, 'fixed_adams': 1, 'adaptive_heun': 2, 'fehlberg2': 3,
+    'bosh3': 3, 'dopri5': 6, 'dopri8': 13,
+}
+# NOTE: adaptive solvers do not step on the output grid, assume this many steps per interval
+_ADAPTIVE_STEPS = 10
+_ADAPTIVE_SOLVERS = 'adaptive_heun fehlberg2 bosh3 dopri5 dopri8'.split()
+_COMPILED_SOLVERS = 'euler midpoint rk4'.split()
+# NOTE: up to this dimension the exact trace (one vector-Jacobian product per dimension) is used by default
+_EXACT_TRACE_DIMS = 8
+
+def _fixed_grid_odeint(func, x, t, method='rk4'):
+    """
+    Same steps as the fixed grid solvers of torchdiffeq stepping on t, written as a plain loop
+    so that `torch.compile` unrolls the whole solve into a single graph.
+    """
+    xs = [x]
+    for i in range(len(t) - 1):
+        t0, t1 = t[i], t[i + 1]
+        dt = t1 - t0
+        k1 = func(t0, x)
+        if method == 'euler':
+            dx = dt * k1
+        elif method == 'midpoint':
+            dx = dt * func(t0 + 0.5 * dt, x + 0.5 * dt * k1)
+        else:
+            # NOTE: the 3/8 rule, as `rk4_alt_step_func` in torchdiffeq
+            k2 = func(t0 + dt / 3, x + dt * k1 / 3)
+            k3 = func(t0 + dt * 2 / 3, x + dt * (k2 - k1 / 3))
+            k4 = func(t1, x + dt * (k1 - k2 + k3))
+            dx = (k1 + 3 * (k2 + k3) + k4) * dt * 0.125
+        x = x + dx
+        xs.append(x)
+    return torch.stack(xs)
+
+class _ODEWrapper(nn.Module):
+    """
+    Base class of the modules wrapping `func` for the solver, forwards the step callbacks of torchdiffeq.
+    """
+    def __init__(self, func):
+        super(_ODEWrapper, self).__init__()
+        self.func = func
+
+    def callback_step(self, t0, y0, dt):
+        if hasattr(self.func, 'callback_step'):
+            self.func.callback_step(t0, y0, dt)
+
+    def callback_step_adjoint(self, t0, y0, dt):
+        if hasattr(self.func, 'callback_step_adjoint'):
+            self.func.callback_step_adjoint(t0, y0, dt)
+
+def _divergence(dxdt, x, trace='hutchinson', probe=None, create_graph=True):
+    """
+    The trace of the Jacobian d(dxdt)/dx per row, exactly (one vector-Jacobian product per dimension) 
+    or with the Hutchinson estimator e^T (d(dxdt)/dx) e for a Rademacher `probe` e (a single one).
+    """
+    if trace == 'exact':
+        return sum([
+            torch.autograd.grad(dxdt[..., i].sum(), x, create_graph=create_graph, retain_graph=True)[0][..., i]
+            for i in range(x.shape[-1])
+        ]).unsqueeze(-1)
+    vjp = torch.autograd.grad(dxdt, x, probe, create_graph=create_graph)[0]
+    return (vjp * probe).sum(-1, keepdim=True)
+
+class _AugmentedODE(_ODEWrapper):
+    """
+    Augments the state of `func` with channels integrated along the trajectories: the change of log-density
+    -tr(dfunc/dx) (instantaneous change of variables) when `trace` is set, then the kinetic energy ||func(t, x)||^2
+    when `energy` is set.
+    """
+    def __init__(self, func, energy=False, trace=None):
+        super(_AugmentedODE, self).__init__(func)
+        self.energy = energy
+        # NOTE: set before each solve, the probe of the Hutchinson estimator is fixed during a solve
+        self.trace, self.probe = trace, None
+
+    def forward(self, t, x):
+        n_channels = int(self.energy) + int(self.trace is not None)
+        x = x[..., :-n_channels]
+        channels = []
+        if self.trace is None:
+            dxdt = self.func(t, x)
+        else:
+            create_graph = torch.is_grad_enabled()
+            with torch.enable_grad():
+                if not x.requires_grad:
+                    x = x.detach().requires_grad_(True)
+                dxdt = self.func(t, x)
+                channels.append(-_divergence(dxdt, x, self.trace, self.probe, create_graph))
+            if not create_graph:
+                dxdt, channels = dxdt.detach(), [channel.detach() for channel in channels]
+        if self.energy:
+            channels.append(dxdt.pow(2).sum(-1, keepdim=True))
+        return torch.cat((dxdt, *channels), dim=-1)
+
+class _ShootingODE(_ODEWrapper):
+    """
+    Solves each row of the state on its own interval [t0, t0 + dt], rescaled to s in [0, 1].
+    """
+    def __init__(self, func, t0, dt):
+        super(_ShootingODE, self).__init__(func)
+        self.t0, self.dt = t0, dt
+
+    def forward(self, s, x):
+        return self.dt * self.func(self.t0 + s * self.dt, x)
+
+class _StepRecorder(nn.Module):
+    """
+    Records the state at the start of every step of the solver (accepted steps for adaptive solvers), 
+    and the derivative there whenever the solver evaluates `func` at that state.
+    """
+    def __init__(self, func, adaptive=False):
+        super(_StepRecorder, self).__init__()
+        self.func = func
+        self.t, self.y, self.f = [], [], []
+        self._first, self._last, self._end = None, None, None
+        # NOTE: fixed grid solvers only support `callback_step`, adaptive ones also report rejected steps
+        if adaptive:
+            self.callback_accept_step = self._record
+        else:
+            self.callback_step = self._record
+
+    def _record(self, t0, y0, dt):
+        # NOTE: the derivative at y0 is either the very first evaluation, or for adaptive solvers with
+        # the FSAL property the last stage of the previous step. Fixed grid solvers evaluate it next.
+        f0 = None
+        for (_, x, dxdt) in filter(None, (self._first, self._end)):
+            if x is y0:
+                f0 = dxdt
+        self.t.append(t0)
+        self.y.append(y0)
+        self.f.append(f0)
+        self._end = self._last
+
+    def forward(self, t, x):
+        dxdt = self.func(t, x)
+        self._last = (t, x, dxdt)
+        if self._first is None:
+            self._first = self._last
+        if self.f and self.f[-1] is None and x is self.y[-1]:
+            self.f[-1] = dxdt
+        return dxdt
+
+class DenseTrajectory:
+    """
+    Piecewise cubic Hermite interpolant of a solution of the ODE, see `ToyModel.dense_forward`.
+        t (torch.tensor): the knots, i.e. where the solver stepped.
+        y (torch.tensor): the solution at the knots, shape (len(t), n, d).
+        f (torch.tensor): the derivative at the knots, shape (len(t), n, d).
+        
+        Method
+        __call__ (Callable)
+            t (torch.tensor | np.ndarray): time points within the knots.
+            return the solution at the time points, shape (len(t), n, d).
+    """
+    def __init__(self, t, y, f):
+        if t[0] > t[-1]:
+            t, y, f = t.flip(0), y.flip(0), f.flip(0)
+        self.t, self.y, self.f = t, y, f
+
+    def __call__(self, t):
+        t = torch.as_tensor(t, dtype=self.t.dtype, device=self.t.device)
+        idx = (torch.searchsorted(self.t, t, right=True) - 1).clamp(0, len(self.t) - 2)
+        t0, t1 = self.t[idx], self.t[idx + 1]
+        h = (t1 - t0)[:, None, None]
+        s = ((t - t0) / (t1 - t0))[:, None, None].to(self.y.dtype)
+        h = h.to(self.y.dtype)
+        return (
+            (2 * s**3 - 3 * s**2 + 1) * self.y[idx] + (s**3 - 2 * s**2 + s) * h * self.f[idx]
+            + (3 * s**2 - 2 * s**3) * self.y[idx + 1] + (s**3 - s**2) * h * self.f[idx + 1]
+        )
+
 class ToyModel(nn.Module):
     """ 
     Neural ODE
@@ -181,69 +511,280 @@ class ToyModel(nn.Module):
         method (str) defaulf '"rk4"': any methods from torchdiffeq.
         rtol (NoneType | float): the relative tolerance of the ODE solver.
         atol (NoneType | float): the absolute tolerance. of the ODE solver.
-        use_norm (bool): if True keeps the norm of func.
-        norm (list of torch.tensor): the norm of the derivative.
+        use_norm (bool): if True integrates the kinetic energy of func, ||func(t, x)||^2 summed over the cells,
+            as an extra channel of the ODE state (no extra evaluations of func).
+        energy (NoneType | torch.tensor): the integrated energy from t[0] at each time point of the last forward pass.
+        adjoint (str) default '"auto"': one of '"auto"', '"always"' or '"never"'. Whether to backpropagate
+            with the adjoint method (`odeint_adjoint`) or directly through the solver (`odeint`). With '"auto"'
+            direct backprop is used when its estimated memory is below `max_memory_mb`.
+        max_memory_mb (float) default '1024': the memory ceiling (in MB) for direct backprop in '"auto"' mode.
+        compile (bool) default 'False': for the '"euler"', '"midpoint"' and '"rk4"' methods, solves without the adjoint 
+            are done by a loop compiled with `torch.compile` into a single graph (in eager mode when profiling func).
+            For the other methods the vector field is compiled, see `compile_ode`.
+        log_density (bool) default 'False': if True integrates the change of log-density of each cell along its trajectory,
+            d log p(x(t)) / dt = -tr(dfunc/dx), as an extra channel of the ODE state (continuous normalizing flow).
+        delta_logp (NoneType | torch.tensor): log p_t(x(t)) - log p_t[0](x(t[0])) of each cell at each time point 
+            of the last forward pass.
+        trace (str) default '"auto"': one of '"auto"', '"hutchinson"' or '"exact"'. How the trace is computed:
+            '"hutchinson"' is an unbiased estimate with one Rademacher probe per cell and solve (one vector-Jacobian
+            product per evaluation of func), '"exact"' costs one vector-Jacobian product per dimension. With '"auto"'
+            the exact trace is used up to 8 dimensions.
         
         Method
         forward (Callable)
             x (torch.tensor): the initial sample
             t (torch.tensor) time points where we suppose x is from t[0]
             return the last sample or the whole seq.      
+        dense_forward (Callable)
+            x (torch.tensor): the initial sample
+            t (torch.tensor) time points where we suppose x is from t[0], see `step_size`.
+            step_size (NoneType | float): for fixed grid solvers, the step size. If None the solver steps on t.
+            return a `DenseTrajectory` which can be evaluated at any time between t[0] and t[-1].
+        shooting_forward (Callable)
+            x (torch.tensor): the initial samples, each row from its own interval (multiple shooting).
+            t0 (torch.tensor): the start time of each row.
+            t1 (torch.tensor): the end time of each row.
+            return the samples at t1, all rows being solved in a single call of the solver. `func` must accept
+            one time per row. With `use_norm` the energy of each row is kept in `energy`, with `log_density` the
+            change of log-density of each row in `delta_logp`.
+        log_likelihood (Callable)
+            x (torch.tensor): the cells at t[-1].
+            t (torch.tensor): time points, the cells are solved back to t[0].
+            base_log_prob (NoneType | Callable): the log-density of the cells at t[0], per row. 
+                A standard normal if None.
+            return the log-likelihood of each cell, requires `log_density`.
     """
+    _valid_adjoint = 'auto always never'.split()
+    _valid_trace = 'auto hutchinson exact'.split()
     
-    def __init__(self, func, method='rk4', rtol=None, atol=None, use_norm=False):
+    def __init__(
+        self, func, method='rk4', rtol=None, atol=None, use_norm=False, adjoint='auto', max_memory_mb=1024, compile=False,
+        log_density=False, trace='auto'
+    ):
         super(ToyModel, self).__init__()        
+        if adjoint not in self._valid_adjoint:
+            raise ValueError(f'adjoint={adjoint} not known. Should be one of {self._valid_adjoint}')
+        if trace not in self._valid_trace:
+            raise ValueError(f'trace={trace} not known. Should be one of {self._valid_trace}')
         self.func = func
         self.method = method
         self.rtol=rtol
         self.atol=atol
         self.use_norm = use_norm
-        self.norm=[]
+        self.energy = None
+        self.log_density = log_density
+        self.trace = trace
+        self.delta_logp = None
+        # NOTE: in a tuple the wrapper is not registered, func stays (once) in the state dict
+        self._augmented_func = (_AugmentedODE(func, energy=use_norm), )
+        self.adjoint = adjoint
+        self.max_memory_mb = max_memory_mb
+        self._use_adjoint = None
+        self._compiled_solve = None
+        if compile and method in _COMPILED_SOLVERS:
+            self._compiled_solve = compile_fn(_fixed_grid_odeint)
+        elif compile:
+            compile_ode(func)
+
+    def backprop_memory(self, x, t):
+        """
+        Rough estimate (in MB) of the activations kept alive when backpropagating directly through
+        the solver, i.e. the number of evaluations of `func` times the activations of one evaluation.
+        """
+        # NOTE: the layers of an `EnsembleODE` are those of its template, x already has one state per member
+        func = self.func._base[0] if isinstance(self.func, EnsembleODE) else self.func
+        widths = [m.out_features for m in func.modules() if isinstance(m, nn.Linear)]
+        # NOTE: linear and activation outputs are both kept by autograd
+        per_eval = x[..., 0].numel() * (x.shape[-1] + 2 * sum(widths)) if widths else 4 * x.numel()
+        n_steps = len(t) - 1
+        if self.method in _ADAPTIVE_SOLVERS:
+            n_steps *= _ADAPTIVE_STEPS
+        n_evals = n_steps * _SOLVER_STAGES.get(self.method, 4)
+        return n_evals * per_eval * x.element_size() / 2**20
+
+    def use_adjoint(self, x, t):
+        """
+        Whether `forward` should use `odeint_adjoint`, the choice is logged whenever it changes.
+        """
+        if self.adjoint != 'auto':
+            use_adjoint = self.adjoint == 'always'
+            reason = f'adjoint={self.adjoint}'
+        else:
+            memory = self.backprop_memory(x, t)
+            use_adjoint = memory > self.max_memory_mb
+            reason = (
+                f'estimated backprop memory {memory:.1f}MB for state {tuple(x.shape)} '
+                f'and {len(t)} time points, ceiling {self.max_memory_mb}MB'
+            )
+        if use_adjoint != self._use_adjoint:
+            _logger.info(f'ToyModel using {"odeint_adjoint" if use_adjoint else "odeint"} ({reason}).')
+            self._use_adjoint = use_adjoint
+        return use_adjoint
+
+    def _members(self, x):
+        # NOTE: with an `EnsembleODE`, every member starts from the same x unless given one x per member
+        n_members = getattr(self.func, 'n_members', None)
+        if n_members is not None and x.dim() == 2:
+            x = x.expand(n_members, *x.shape)
+        return x
+
+    def _solve(self, func, x, t):
+        x = self._members(x)
+        # NOTE: without gradients there is nothing to backpropagate, the adjoint only adds overhead
+        use_adjoint = torch.is_grad_enabled() and self.use_adjoint(x, t)
+        solver = odeint_adjoint if use_adjoint else odeint
+        
+        kwargs = {}
+        if self.atol is not None:
+            kwargs['atol'] = self.atol
+        if self.rtol is not None:
+            kwargs['rtol'] = self.rtol
+        n_channels = int(self.log_density) + int(self.use_norm)
+        if n_channels:
+            augmented = self._augmented_func[0] if func is self.func else _AugmentedODE(func, energy=self.use_norm)
+            augmented.trace = self._trace(x) if self.log_density else None
+            # NOTE: Rademacher probe, +1 or -1 for each coordinate
+            augmented.probe = torch.randint_like(x, 2) * 2 - 1 if augmented.trace == 'hutchinson' else None
+            x = torch.cat((x, torch.zeros_like(x[..., :n_channels])), dim=-1)
+            func = augmented
+        # NOTE: the compiled loop is only used for func itself, a new module at every call would recompile
+        compiled = (
+            self._compiled_solve is not None and not use_adjoint and not self.log_density
+            and (func is self.func or func is self._augmented_func[0]) and not getattr(self.func, 'profile', False)
+        )
+        if compiled:
+            x = self._compiled_solve(func, x, t, self.method)
+        else:
+            x = solver(func, x, t, method=self.method, **kwargs)
+        if not n_channels:
+            return x, None, None
+        channels = list(x[..., -n_channels:].unbind(-1))
+        delta_logp = channels.pop(0) if self.log_density else None
+        energy = channels.pop(0) if self.use_norm else None
+        return x[..., :-n_channels], energy, delta_logp
+
+    def _trace(self, x):
+        if self.trace != 'auto':
+            return self.trace
+        return 'exact' if x.shape[-1] <= _EXACT_TRACE_DIMS else 'hutchinson'
 
     def forward(self, x, t, return_whole_sequence=False):
+        profile = getattr(self.func, 'profile', False)
+        if profile:
+            self.func.phase = 'forward'
 
-        if self.use_norm:
-            for time in t: 
-                self.norm.append(torch.linalg.norm(self.func(time,x)).pow(2))
-        if self.atol is None and self.rtol is None:
-            x = odeint(self.func,x ,t, method=self.method)
-        elif self.atol is not None and self.rtol is None:
-            x = odeint(self.func,x ,t, method=self.method, atol=self.atol)
-        elif self.atol is None and self.rtol is not None:
-            x = odeint(self.func,x ,t, method=self.method, rtol=self.rtol)
-        else: 
-            x = odeint(self.func,x ,t, method=self.method, atol=self.atol, rtol=self.rtol)          
+        x, energy, delta_logp = self._solve(self.func, x, t)
+        if energy is not None:
+            # NOTE: the integral is negative when solving backward in time
+            self.energy = energy.sum(-1).abs()
+        if delta_logp is not None:
+            self.delta_logp = delta_logp
+        if profile:
+            # NOTE: any further evaluation of func comes from the backward pass
+            self.func.phase = 'adjoint'
        
         x = x[-1] if not return_whole_sequence else x
         return x
 
+    def shooting_forward(self, x, t0, t1):
+        profile = getattr(self.func, 'profile', False)
+        if profile:
+            self.func.phase = 'forward'
+
+        t0 = t0.reshape(-1, 1).to(x)
+        dt = t1.reshape(-1, 1).to(x) - t0
+        s = torch.tensor([0., 1.]).to(x)
+        x, energy, delta_logp = self._solve(_ShootingODE(self.func, t0, dt), x, s)
+        if energy is not None:
+            # NOTE: ||dx/ds||^2 ds = dt ||dx/dt||^2 dt
+            self.energy = energy[-1] / dt.abs().squeeze(1)
+        if delta_logp is not None:
+            self.delta_logp = delta_logp[-1]
+        if profile:
+            self.func.phase = 'adjoint'
+        return x[-1]
+
+    def log_likelihood(self, x, t, base_log_prob=None):
+        if not self.log_density:
+            raise ValueError('log_likelihood requires a model with log_density=True')
+        if base_log_prob is None:
+            base_log_prob = lambda x0: torch.distributions.Normal(0., 1.).log_prob(x0).sum(-1)
+        profile = getattr(self.func, 'profile', False)
+        if profile:
+            self.func.phase = 'forward'
+        # NOTE: solving back from t[-1], delta_logp = log p_t[0](x0) - log p_t[-1](x)
+        x0, _, delta_logp = self._solve(self.func, x, t.flip(0))
+        if profile:
+            self.func.phase = 'adjoint'
+        return base_log_prob(x0[-1]) - delta_logp[-1]
+
+    def dense_forward(self, x, t, step_size=None):
+        # NOTE: unlike passing a fine grid to `forward`, the solver takes its natural steps (or steps on t 
+        # for fixed grid solvers), the output time points are interpolated with cubic Hermite polynomials.
+        adaptive = self.method in _ADAPTIVE_SOLVERS
+        recorder = _StepRecorder(self.func, adaptive=adaptive)
+        kwargs = {}
+        if self.atol is not None:
+            kwargs['atol'] = self.atol
+        if self.rtol is not None:
+            kwargs['rtol'] = self.rtol
+        if step_size is not None and not adaptive:
+            kwargs['options'] = {'step_size': step_size}
+        x = self._members(x)
+        y = odeint(recorder, x, t, method=self.method, **kwargs)
+
+        knots_t = torch.stack([*recorder.t, t[-1]]).to(t)
+        knots_y = [*recorder.y, y[-1]]
+        knots_f = [*recorder.f, None]
+        # NOTE: adaptive solvers reuse the last stage (FSAL) so the derivatives have to be evaluated
+        knots_f = [f if f is not None else self.func(tk, yk) for tk, yk, f in zip(knots_t, knots_y, knots_f)]
+        return DenseTrajectory(knots_t, torch.stack(knots_y), torch.stack(knots_f))
+
 # %% ../nbs/03_models.ipynb 7
-from torchdiffeq import odeint_adjoint as odeint
 import os, math, numpy as np
 import torch
 import torch.nn as nn
 import torchsde
 
+# NOTE: the solvers of torchsde for each type of SDE
+_SDE_METHODS = {
+    'ito': 'euler milstein srk'.split(),
+    'stratonovich': 'euler_heun heun midpoint milstein reversible_heun'.split(),
+}
+
 class ToySDEModel(nn.Module):
     """ 
     Neural SDE model
         func (nn.Module): drift term.
         genc (nn.Module): diffusion term.
-        method (str): method of the SDE solver.
+        method (str): method of the SDE solver, '"euler"', '"milstein"' or '"srk"' for Ito SDEs, and
+            '"euler_heun"', '"heun"', '"midpoint"', '"milstein"' or '"reversible_heun"' for Stratonovich SDEs.
+        dt (float) default '0.1': the (initial, when adaptive) step size.
+        adaptive (bool) default 'False': whether to adapt the step size to the error tolerances, 
+            for the methods with an error estimate.
+        rtol (NoneType|float) default 'None': relative tolerance of the adaptive steps, the default of torchsde if None.
+        atol (NoneType|float) default 'None': absolute tolerance of the adaptive steps, the default of torchsde if None.
         
         Method
         forward (Callable)
             x (torch.tensor): the initial sample
             t (torch.tensor) time points where we suppose x is from t[0]
+            dt (NoneType|float): overrides `self.dt`.
             return the last sample or the whole seq.  
+        sample (Callable)
+            draws `n_samples` trajectories of every initial cell in one batched solve, see its docstring.
+        set_solver (Callable)
+            changes the solver configuration, see the parameters above.
     """
     
     def __init__(self, func, method='euler', noise_type='diagonal', sde_type='ito', 
-    in_features=2, out_features=2, gunc=None, dt=0.1):
+    in_features=2, out_features=2, gunc=None, dt=0.1, adaptive=False, rtol=None, atol=None):
         super(ToySDEModel, self).__init__()        
         self.func = func
-        self.method = method
         self.noise_type = noise_type
+        _valid_sde_type = list(_SDE_METHODS)
+        if sde_type not in _valid_sde_type:
+            raise ValueError(f'sde_type={sde_type} not in {_valid_sde_type}')
         self.sde_type = sde_type
         if gunc is None:
             self._gunc_args = 'y'
@@ -252,7 +793,39 @@ class ToySDEModel(nn.Module):
             self._gunc_args = 't,y'
             self.gunc = gunc
 
-        self.dt = dt
+        self.method, self.dt, self.adaptive, self.rtol, self.atol = None, None, False, None, None
+        self.set_solver(method, dt, adaptive, rtol, atol)
+        self._bm, self._bm_key = None, None
+
+    def set_solver(self, method=None, dt=None, adaptive=None, rtol=None, atol=None):
+        """
+        Sets the given solver parameters (see `ToySDEModel`), the others are left unchanged.
+        """
+        method = self.method if method is None else method
+        _valid_method = _SDE_METHODS[self.sde_type]
+        if method not in _valid_method:
+            raise ValueError(f'method={method} not in {_valid_method} for sde_type={self.sde_type}')
+        self.method = method
+        self.dt = self.dt if dt is None else dt
+        self.adaptive = self.adaptive if adaptive is None else adaptive
+        self.rtol = self.rtol if rtol is None else rtol
+        self.atol = self.atol if atol is None else atol
+        return self
+
+    def _levy_area_approximation(self):
+        # NOTE: the stochastic Runge-Kutta steps need the space-time Levy area of the Brownian motion
+        return 'space-time' if self.method == 'srk' else 'none'
+
+    def _sdeint_kwargs(self, dt=None, adjoint=False):
+        kwargs = {'method': self.method, 'dt': self.dt if dt is None else dt, 'adaptive': self.adaptive}
+        if self.rtol is not None:
+            kwargs['rtol'] = self.rtol
+        if self.atol is not None:
+            kwargs['atol'] = self.atol
+        if adjoint and self.method == 'reversible_heun':
+            # NOTE: the reversible Heun method has an algebraically exact adjoint
+            kwargs['adjoint_method'] = 'adjoint_reversible_heun'
+        return kwargs
         
     def f(self, t, y):
         return self.func(t, y)
@@ -262,8 +835,53 @@ class ToySDEModel(nn.Module):
         return 0.3 * torch.sigmoid(torch.cos(t) * torch.exp(-y))
 
     def forward(self, x, t, return_whole_sequence=False, dt=None):
-        dt = self.dt if self.dt is not None else 0.1 if dt is None else dt        
-        x = torchsde.sdeint(self, x, t, method=self.method, dt=dt)
+        bm = self.brownian_motion(x.shape, t, device=x.device, dtype=x.dtype)
+        x = torchsde.sdeint(self, x, t, bm=bm, **self._sdeint_kwargs(dt))
        
         x = x[-1] if not return_whole_sequence else x
         return x
+
+    def brownian_motion(self, size, t, seed=None, device=None, dtype=None, tol=None):
+        """
+        A `torchsde.BrownianInterval` over [t[0], t[-1]]. With a `seed` the same tree is kept for repeated calls
+        with the same size and times, so the paths are reproducible and queries hit its cache.
+        Note that the path depends on the seed and on the query points (i.e. the solver steps), unless `tol`
+        is given: the path is then resolved to that tolerance on a dyadic tree, the same for any solver (slower).
+        """
+        t0, t1 = float(t[0]), float(t[-1])
+        levy_area_approximation = self._levy_area_approximation()
+        key = (tuple(size), t0, t1, seed, device, dtype, levy_area_approximation, tol)
+        if seed is not None and key == self._bm_key:
+            return self._bm
+        kwargs = {} if tol is None else {'tol': tol, 'halfway_tree': True}
+        bm = torchsde.BrownianInterval(
+            t0=t0, t1=t1, size=size, dtype=dtype, device=device, entropy=seed, 
+            levy_area_approximation=levy_area_approximation, **kwargs
+        )
+        if seed is not None:
+            self._bm, self._bm_key = bm, key
+        return bm
+
+    def sample(self, x, t, n_samples=10, seed=None, adjoint=False, dt=None, return_whole_sequence=True, tol=None):
+        """
+        Samples `n_samples` trajectories of every cell of x in a single solve, the cells being replicated 
+        in the batch of the state.
+            x (torch.tensor): the initial cells, of shape (n, d).
+            t (torch.tensor): the (increasing) time points, x being from t[0].
+            n_samples (int) default '10': the number of trajectories per cell.
+            seed (NoneType|int) default 'None': the seed of the Brownian motion, see `brownian_motion`.
+            adjoint (bool) default 'False': whether to use `torchsde.sdeint_adjoint`, with memory independent
+                of the number of steps when backpropagating. For Ito SDEs the adjoint assumes diagonal noise, i.e. 
+                each output of `g` depending only on the same coordinate of y, which the default `nn.Linear` does not.
+            dt (NoneType|float) default 'None': the step size, `self.dt` if None.
+            tol (NoneType|float) default 'None': see `brownian_motion`, e.g. to compare solvers on the same paths.
+            return the samples of shape (n_samples, len(t), n, d), or (n_samples, n, d) for the last time point.
+        """
+        n = x.shape[0]
+        xs = x.repeat(n_samples, *[1] * (x.dim() - 1))
+        bm = self.brownian_motion(xs.shape, t, seed=seed, device=xs.device, dtype=xs.dtype, tol=tol)
+        solver = torchsde.sdeint_adjoint if adjoint else torchsde.sdeint
+        ys = solver(self, xs, t, bm=bm, **self._sdeint_kwargs(dt, adjoint))
+        # NOTE: the replicas are stacked along the batch, (T, n_samples * n, d) -> (n_samples, T, n, d)
+        ys = ys.reshape(len(t), n_samples, n, *x.shape[1:]).transpose(0, 1)
+        return ys if return_whole_sequence else ys[:, -1]
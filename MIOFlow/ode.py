@@ -7,6 +7,7 @@ __all__ = ['ode_solve', 'ODEF', 'ODEAdjoint', 'NeuralODE']
 import os, math, numpy as np
 import torch
 import torch.nn as nn
+from .utils import compile_fn
 
 def ode_solve(z0, t0, t1, f):
     """
@@ -54,7 +55,7 @@ class ODEF(nn.Module):
     
 class ODEAdjoint(torch.autograd.Function):
     @staticmethod
-    def forward(ctx, z0, t, flat_parameters, func):
+    def forward(ctx, z0, t, flat_parameters, func, solve=ode_solve):
         assert isinstance(func, ODEF)
         bs, *z_shape = z0.size()
         time_len = t.size(0)
@@ -63,7 +64,7 @@ class ODEAdjoint(torch.autograd.Function):
             z = torch.zeros(time_len, bs, *z_shape).to(z0)
             z[0] = z0
             for i_t in range(time_len - 1):
-                z0 = ode_solve(z0, t[i_t], t[i_t+1], func)
+                z0 = solve(z0, t[i_t], t[i_t+1], func)
                 z[i_t+1] = z0
 
         ctx.func = func
@@ -149,17 +150,23 @@ class ODEAdjoint(torch.autograd.Function):
             # Adjust adjoints
             adj_z += dLdz_0
             adj_t[0] = adj_t[0] - dLdt_0
-        return adj_z.view(bs, *z_shape), adj_t, adj_p, None
+        return adj_z.view(bs, *z_shape), adj_t, adj_p, None, None
     
 class NeuralODE(nn.Module):
-    def __init__(self, func):
+    """
+    compile (bool): if True the fixed step solver loop of the forward pass (`ode_solve` with `func`)
+        is compiled with `torch.compile`, see `compile_fn`. The augmented dynamics of the backward pass
+        are a new function at every call and stay in eager mode.
+    """
+    def __init__(self, func, compile=False):
         super(NeuralODE, self).__init__()
         assert isinstance(func, ODEF)
         self.func = func
+        self.solve = compile_fn(ode_solve) if compile else ode_solve
 
     def forward(self, z0, t=torch.Tensor([0., 1.]), return_whole_sequence=False):
         t = t.to(z0)
-        z = ODEAdjoint.apply(z0, t, self.func.flatten_parameters(), self.func)
+        z = ODEAdjoint.apply(z0, t, self.func.flatten_parameters(), self.func, self.solve)
         if return_whole_sequence:
             return z
         else:
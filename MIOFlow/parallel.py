@@ -0,0 +1,383 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/12_parallel.ipynb.
+
+# %% auto 0
+__all__ = ['DataParallelOptimizer', 'run_data_parallel', 'PlotWorker', 'run_leave_one_out']
+
+# %% ../nbs/12_parallel.ipynb 3
+import os, io, sys, socket, inspect, itertools, logging
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+
+from .utils import set_seeds
+from .exp import exp_log_filename
+
+class DataParallelOptimizer:
+    '''
+    Wraps `optimizer` to average the gradients of its parameters over the processes of the default
+    `torch.distributed` process group before each `step`, so that every process takes the same step.
+    Everything else (e.g. `zero_grad`, `state_dict`) is the wrapped optimizer's.
+
+    Notes:
+    ----------
+        - A parameter without gradient in every process keeps `grad=None` (and is skipped by the optimizer).
+    '''
+    def __init__(self, optimizer):
+        self.optimizer = optimizer
+
+    def __getattr__(self, name):
+        return getattr(self.optimizer, name)
+
+    def step(self, closure=None):
+        params = [p for group in self.optimizer.param_groups for p in group['params']]
+        grads = [p.grad if p.grad is not None else torch.zeros_like(p) for p in params]
+        has_grad = torch.tensor([float(p.grad is not None) for p in params])
+        # NOTE: a single all-reduce for all the gradients and the flags
+        flat = _flatten_dense_tensors([*grads, has_grad.to(grads[0])])
+        dist.all_reduce(flat)
+        *grads, has_grad = _unflatten_dense_tensors(flat, [*grads, has_grad])
+        world_size = dist.get_world_size()
+        for p, grad, flag in zip(params, grads, has_grad.tolist()):
+            p.grad = grad.div_(world_size) if flag > 0 else None
+        return self.optimizer.step(closure)
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _data_parallel_worker(rank, fn, n_workers, port, seed, exp_dir, n_threads, kwargs, queue):
+    torch.set_num_threads(n_threads)
+    dist.init_process_group('gloo', init_method=f'tcp://127.0.0.1:{port}', rank=rank, world_size=n_workers)
+    try:
+        model, optimizer = kwargs['model'], kwargs['optimizer']
+        # NOTE: the tensors arrive in memory shared by all the processes, each one needs its own copy.
+        #   Every process starts from the parameters of rank 0, then samples its own batches.
+        for tensor in itertools.chain(model.parameters(), model.buffers()):
+            tensor.data = tensor.data.clone()
+            dist.broadcast(tensor.data, 0)
+        for state in optimizer.state.values():
+            for key, value in state.items():
+                if torch.is_tensor(value):
+                    state[key] = value.clone()
+        set_seeds(seed + rank)
+        kwargs = {**kwargs, 'optimizer': DataParallelOptimizer(optimizer)}
+        parameters = inspect.signature(fn).parameters
+        if exp_dir is not None and 'exp_dir' in parameters:
+            kwargs['exp_dir'] = exp_dir
+
+        if rank == 0 and exp_dir is not None:
+            # NOTE: appends to the log of the experiment, as configured by `config_exp_logger`
+            handler = logging.FileHandler(exp_log_filename(exp_dir), mode='a', encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s\t%(levelname)s:%(message)s', '%d/%m/%Y %I:%M:%S %p'))
+            logging.getLogger().addHandler(handler)
+            logging.getLogger().setLevel(logging.DEBUG)
+            if kwargs.get('logger') is None:
+                kwargs['logger'] = logging.getLogger(os.path.basename(exp_dir))
+        if rank != 0:
+            # NOTE: progress bars, warnings and prints are those of rank 0
+            sys.stdout = sys.stderr = open(os.devnull, 'w')
+            logger = logging.getLogger(f'{__name__}.rank{rank}')
+            logger.propagate = False
+            logger.disabled = True
+            if 'logger' in parameters:
+                kwargs['logger'] = logger
+            # NOTE: the plots, checkpoint and losses of the experiment are written by rank 0 only
+            for name, value in [('plot_every', None), ('checkpoint_every', None), ('stream_losses', False)]:
+                if name in parameters:
+                    kwargs[name] = value
+
+        result = fn(**kwargs)
+        if rank == 0:
+            # NOTE: serialized, tensors shared with the parent would not outlive the process
+            buffer = io.BytesIO()
+            torch.save((model.state_dict(), optimizer.state_dict(), result), buffer)
+            queue.put(buffer.getvalue())
+    finally:
+        dist.destroy_process_group()
+
+def run_data_parallel(fn, n_workers=2, seed=0, exp_dir=None, n_threads=None, **kwargs):
+    '''
+    Notes:
+    ----------
+        - Runs `fn(**kwargs)` in `n_workers` local processes (CPU, `torch.distributed` with the gloo backend).
+            Each process samples its own batches (seed `seed + rank`) and the gradients are averaged over 
+            the processes before each optimizer step (see `DataParallelOptimizer`), i.e. the batch of a step 
+            is `n_workers` times larger.
+        - The returned losses are those of rank 0, which alone logs (to `exp_dir`), prints, plots and writes
+            the checkpoints and losses of `training_regimen`.
+        - The trained parameters and optimizer state are loaded back into `model` and `optimizer`.
+
+    Arguments:
+    ----------
+        fn (Callable): the training function, e.g. `train` or `training_regimen`.
+        n_workers (int): Defaults to `2`. The number of processes.
+        seed (int): Defaults to `0`. The seed of rank 0, rank `r` uses `seed + r`.
+        exp_dir (str | NoneType): Defaults to `None`. Experiment directory whose log (see `config_exp_logger`)
+            receives the messages of rank 0, also passed to `fn` when it takes an `exp_dir` (e.g. `training_regimen`).
+        n_threads (int | NoneType): Defaults to `None`. The number of threads of each process, 
+            the cores divided by `n_workers` if `None`.
+        kwargs: the arguments of `fn`, passed by name. They must include `model` and `optimizer`.
+    Returns:
+    ----------
+        result: the return value of `fn` on rank 0.
+    '''
+    model, optimizer = kwargs['model'], kwargs['optimizer']
+    if n_threads is None:
+        n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+    queue = mp.get_context('spawn').SimpleQueue()
+    context = mp.spawn(
+        _data_parallel_worker, nprocs=n_workers, join=False,
+        args=(fn, n_workers, _free_port(), seed, exp_dir, n_threads, kwargs, queue)
+    )
+    # NOTE: read the result before joining, a large result would block rank 0 on a full pipe.
+    #   `join` raises (and terminates the other processes) as soon as one process fails.
+    while queue.empty():
+        context.join(timeout=1)
+    payload = queue.get()
+    while not context.join():
+        pass
+    model_state, optimizer_state, result = torch.load(io.BytesIO(payload), weights_only=False)
+    model.load_state_dict(model_state)
+    optimizer.load_state_dict(optimizer_state)
+    return result
+
+# %% ../nbs/12_parallel.ipynb 6
+import copy, queue as _queue, warnings
+
+def _to_bytes(obj):
+    buffer = io.BytesIO()
+    torch.save(obj, buffer)
+    return buffer.getvalue()
+
+def _from_bytes(payload):
+    return torch.load(io.BytesIO(payload), map_location='cpu', weights_only=False)
+
+def _plot_worker(model, autoencoder, df, path, settings, requests):
+    import matplotlib.pyplot as plt
+    from MIOFlow.eval import generate_plot_data
+    from MIOFlow.plots import plot_comparision
+    plt.switch_backend('Agg')
+    # NOTE: one thread, the cores are for training
+    torch.set_num_threads(1)
+    model, autoencoder = _from_bytes(model), _from_bytes(autoencoder)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        state, file = _from_bytes(request)
+        model.load_state_dict(state)
+        generated, trajectories = generate_plot_data(model, df, **settings, use_cuda=False, autoencoder=autoencoder)
+        plot_comparision(
+            df, generated, trajectories,
+            palette = 'viridis', df_time_key='samples',
+            save=True, path=path, file=file,
+            x='d1', y='d2', z='d3', is_3d=False
+        )
+
+class PlotWorker:
+    '''
+    Renders the `plot_comparision` of snapshots of `model` (see `submit`) in a separate process, so that
+    training continues while the plot data is generated and drawn.
+
+    Notes:
+    ----------
+        - The worker receives a CPU copy of `model` and `autoencoder` once, then the weights of each snapshot.
+        - At most `max_pending` snapshots wait for the worker. When they are all taken, a new snapshot 
+            is held back and replaced by the next one (i.e. the older one is dropped).
+        - `close` waits for the submitted plots.
+        - The worker is started with 'spawn', which imports the `__main__` module again: a script must guard 
+            its training with `if __name__ == '__main__':`, otherwise the worker fails and the plots are missing.
+
+    Arguments:
+    ----------
+        model (nn.Module): the model being trained.
+        df (pd.DataFrame): DataFrame containing a column for the timepoint samples and the rest of the data.
+        path (str): the directory of the plots.
+        n_points, n_trajectories, n_bins, sample_with_replacement, recon: see `generate_plot_data`.
+        autoencoder (nn.Module|NoneType): Default to None, the trained autoencoder.
+        max_pending (int): Defaults to `2`. The size of the queue of snapshots.
+        logger (NoneType|Logger): Default to 'None'. The logger to record information.
+    '''
+    def __init__(
+        self, model, df, path, n_points, n_trajectories, n_bins, 
+        sample_with_replacement=False, autoencoder=None, recon=False, max_pending=2, logger=None
+    ):
+        self.logger = logger
+        self.pending = None
+        self.n_dropped = 0
+        settings = dict(
+            n_points=n_points, n_trajectories=n_trajectories, n_bins=n_bins, 
+            sample_with_replacement=sample_with_replacement, recon=recon
+        )
+        context = mp.get_context('spawn')
+        self.requests = context.Queue(maxsize=max_pending)
+        self.process = context.Process(
+            target=_plot_worker, daemon=True,
+            args=(_to_bytes(copy.deepcopy(model).cpu()), _to_bytes(copy.deepcopy(autoencoder)), df, path, settings, self.requests)
+        )
+        self.process.start()
+
+    def _put(self, item, block):
+        try:
+            self.requests.put(item, block=block, timeout=1 if block else None)
+            return True
+        except _queue.Full:
+            return False
+
+    def submit(self, model, file):
+        '''
+        Queues the plot of the current weights of `model` to `file`, without waiting.
+        '''
+        if self.pending is not None:
+            self.n_dropped += 1
+        self.pending = _to_bytes((model.state_dict(), file))
+        if self._put(self.pending, block=False):
+            self.pending = None
+
+    def close(self):
+        # NOTE: waits while the worker is alive, a failed worker would never take the requests
+        while self.pending is not None and self.process.is_alive():
+            if self._put(self.pending, block=True):
+                self.pending = None
+        while self.process.is_alive() and not self._put(None, block=True):
+            pass
+        self.process.join()
+        if self.process.exitcode != 0:
+            self._warn(f'The plotting process failed (exit code {self.process.exitcode}), plots may be missing.')
+        if self.n_dropped > 0:
+            self._warn(f'{self.n_dropped} plot(s) dropped, the plotting process was busy.')
+
+    def _warn(self, message):
+        warnings.warn(message)
+        if self.logger is not None:
+            self.logger.warning(message)
+
+# %% ../nbs/12_parallel.ipynb 7
+import time
+import numpy as np, pandas as pd
+
+from .exp import gen_exp_name, setup_exp
+
+def _hold_out_job(df, config, path, hold_out, seed, n_threads, n_points, samples_key):
+    from MIOFlow.models import make_model
+    from MIOFlow.train import training_regimen
+    from MIOFlow.eval import generate_points, calculate_nn
+    from MIOFlow.losses import MMD_loss, OT_loss
+    torch.set_num_threads(n_threads)
+    set_seeds(seed)
+    params = {**copy.deepcopy(config), 'hold_out': hold_out, 'seed': seed}
+    # NOTE: the objects of the training config (e.g. `criterion`) are not saved, 
+    #   the tuples are saved as lists (see `load_exp_params`)
+    params['train'] = {
+        k: list(v) if isinstance(v, tuple) else v for k, v in params.get('train', {}).items() 
+        if v is None or isinstance(v, (bool, int, float, str, list, tuple, dict))
+    }
+    exp_dir, logger = setup_exp(path, params, name=f'hold_out_{hold_out}')
+
+    groups = sorted(df[samples_key].unique())
+    model = make_model(**config.get('model', {}))
+    optimizer = torch.optim.AdamW(model.parameters(), **config.get('optimizer', {}))
+    start = time.time()
+    training_regimen(
+        **{'n_local_epochs': 0, 'n_epochs': 0, 'n_post_local_epochs': 0, **config.get('train', {})},
+        exp_dir=exp_dir, model=model, df=df, groups=groups, optimizer=optimizer, logger=logger,
+        hold_one_out=True, hold_out=hold_out, 
+        # NOTE: the job runs in a daemonic process, which cannot start the `PlotWorker`
+        async_plots=False
+    )
+    elapsed = time.time() - start
+
+    model.eval()
+    with torch.no_grad():
+        generated = generate_points(model, df, n_points=n_points, samples_key=samples_key)
+    generated = generated[groups.index(hold_out)]
+    true = df[df[samples_key] == hold_out].drop(columns=samples_key).values
+    if generated.shape[1] != true.shape[1]:
+        raise ValueError(f'The model generates {generated.shape[1]} dimensions, the data has {true.shape[1]}')
+    source, target = torch.tensor(generated, dtype=torch.float), torch.tensor(true, dtype=torch.float)
+    # NOTE: `MMD_loss` compares as many points on both sides, the larger side is subsampled
+    rng = np.random.default_rng(seed)
+    n = min(len(source), len(target))
+    mmd_source, mmd_target = [x[torch.from_numpy(rng.choice(len(x), n, replace=False))] for x in (source, target)]
+    metrics = {
+        'hold_out': hold_out,
+        'nn': calculate_nn(df, generated=[generated], groups=[hold_out], sample_key=samples_key, logger=logger),
+        'ot': OT_loss(use_cuda=False)(source, target).item(),
+        'mmd': MMD_loss()(mmd_source, mmd_target).item(),
+        'train_time': elapsed,
+        'exp_dir': exp_dir,
+    }
+    logger.info(f'Held out metrics: {metrics}')
+    return metrics
+
+# NOTE: the arguments of `training_regimen` set by `_hold_out_job`
+_HOLD_OUT_ARGS = {'exp_dir', 'model', 'df', 'groups', 'optimizer', 'logger', 'hold_one_out', 'hold_out', 'async_plots'}
+
+def run_leave_one_out(
+    df, config, path, hold_outs=None, n_workers=2, n_threads=None, seed=0, 
+    n_points=None, samples_key='samples', name=None
+):
+    '''
+    Notes:
+    ----------
+        - Trains one model per held out timepoint (`training_regimen` with `hold_one_out=True` and 
+            `hold_out` set to the timepoint), `n_workers` trainings at a time in local processes.
+        - Each training writes to its own experiment `<path>/<name>/hold_out_<timepoint>` (see `setup_exp`),
+            the table of held out metrics is saved to `<path>/<name>/hold_out.csv`.
+        - The metrics compare the points generated at the held out timepoint (see `generate_points`) 
+            with its cells: the mean 1-NN distance (see `calculate_nn`), the OT (`OT_loss`) and the MMD (`MMD_loss`,
+            between as many generated points and cells, the larger side is subsampled).
+        - The plots of `plot_every` are drawn synchronously (`async_plots=False`).
+
+    Arguments:
+    ----------
+        df (pd.DataFrame): DataFrame containing a column for the timepoint samples and the rest of the data.
+        config (dict): The keyword arguments of `make_model` under `'model'`, of `torch.optim.AdamW` under 
+            `'optimizer'` and of `training_regimen` under `'train'` (the epochs default to `0`). The arguments
+            set by each job (`exp_dir`, `model`, `df`, `groups`, `optimizer`, `logger`, `hold_one_out`, 
+            `hold_out` and `async_plots`) cannot be in `'train'`.
+        path (str): full path to where to create experiments, i.e. `<path-to-experiments-dir>`.
+        hold_outs (list | NoneType): Defaults to `None`. The timepoints to hold out, all but the first 
+            (from which the points are generated) if `None`.
+        n_workers (int): Defaults to `2`. The number of trainings at a time.
+        n_threads (int | NoneType): Defaults to `None`. The number of threads of each training, 
+            the cores divided by `n_workers` if `None`.
+        seed (int): Defaults to `0`. The seed of every training.
+        n_points (int | NoneType): Defaults to `None`. The number of generated points, 
+            the number of cells of the first timepoint if `None`.
+        samples_key (str): Defaults to `'samples'`. The column in the `df` which has the timepoint groups.
+        name (str | NoneType): Defaults to `None`. The name of the run, a timestamp if `None` (see `gen_exp_name`).
+    Returns:
+    ----------
+        metrics (pd.DataFrame): one row of held out metrics per timepoint, indexed by `hold_out`.
+    '''
+    reserved = _HOLD_OUT_ARGS.intersection(config.get('train', {}))
+    if reserved:
+        raise ValueError(f'The training config cannot set {sorted(reserved)}, they are set by each job')
+    groups = sorted(df[samples_key].unique())
+    if hold_outs is None:
+        hold_outs = groups[1:]
+    unknown = [g for g in hold_outs if g not in groups]
+    if unknown:
+        raise ValueError(f'Unknown timepoints to hold out {unknown} (groups are {groups})')
+    if n_threads is None:
+        n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+    if n_points is None:
+        n_points = int((df[samples_key] == groups[0]).sum())
+    # NOTE: plain python values, for the parameters (yaml) and the names of the experiments
+    hold_outs = [g.item() if isinstance(g, np.generic) else g for g in hold_outs]
+    run_dir = os.path.join(path, gen_exp_name(name))
+
+    # NOTE: a new process per training, so that each one configures the logging of its own experiment
+    with mp.get_context('spawn').Pool(n_workers, maxtasksperchild=1) as pool:
+        jobs = [
+            pool.apply_async(_hold_out_job, (df, config, run_dir, g, seed, n_threads, n_points, samples_key))
+            for g in hold_outs
+        ]
+        rows = [job.get() for job in jobs]
+
+    metrics = pd.DataFrame(rows).set_index('hold_out')
+    metrics.to_csv(os.path.join(run_dir, 'hold_out.csv'))
+    return metrics
@@ -1,7 +1,7 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/05_train.ipynb.
 
 # %% auto 0
-__all__ = ['train', 'train_ae', 'training_regimen']
+__all__ = ['EmbeddingCache', 'LossHistory', 'train', 'train_ae', 'ConvergenceMonitor', 'training_regimen']
 
 # %% ../nbs/05_train.ipynb 3
 import os, sys, json, math, itertools
@@ -13,9 +13,247 @@ from tqdm.notebook import tqdm
 
 import torch
 
-from .utils import sample, generate_steps
+from .utils import sample, generate_steps, group_extract
 from .losses import MMD_loss, OT_loss, Density_loss, Local_density_loss
 
+def _record_nfe(nfe_stats, key, func):
+    '''
+    Adds the counters of `func` (see `ToyODE.profile`) to `nfe_stats[key]` and resets them.
+    '''
+    stats = nfe_stats.setdefault(key, {'calls': 0, 'nfe': {}, 'n_steps': {}, 'nfe_time': {}})
+    stats['calls'] += 1
+    for name in 'nfe n_steps nfe_time'.split():
+        for phase, value in getattr(func, name).items():
+            stats[name][phase] = stats[name].get(phase, 0) + value
+    func.reset_nfe()
+
+def _format_nfe(key, stats):
+    calls = stats['calls']
+    return f'NFE {key}: ' + ', '.join([
+        f'{phase} {stats["nfe"][phase] / calls:.1f} '
+        f'({stats["n_steps"][phase] / calls:.1f} steps, {1000 * stats["nfe_time"][phase] / calls:.2f}ms)'
+        for phase in stats['nfe']
+    ])
+
+class EmbeddingCache:
+    '''
+    The cells of every timepoint of `df` encoded once by a frozen `encoder`, to sample directly in latent space 
+    (as `sample` does in data space) instead of encoding every sample during training.
+    
+    Notes:
+        - The cells are encoded again whenever the parameters of the encoder changed since they were encoded,
+            which is checked at each `sample` from the version counters of the parameters (bumped by 
+            the optimizer steps and `load_state_dict`).
+
+    Arguments:
+        df (pd.DataFrame): the DataFrame from which to extract batch data.
+
+        encoder (nn.Module): the encoder, e.g. `autoencoder.encoder`.
+
+        use_cuda (bool): Defaults to `False`. Whether or not to keep the latent cells on cuda.
+
+        batch_size (int): Defaults to `4096`. The number of cells encoded at once.
+    '''
+    def __init__(self, df, encoder, use_cuda=False, batch_size=4096):
+        self.df = df
+        self.encoder = encoder
+        self.use_cuda = use_cuda
+        self.batch_size = batch_size
+        self.groups = sorted(df['samples'].unique())
+        self.latent = {}
+        self._version = None
+
+    def version(self):
+        return tuple(
+            (tensor.data_ptr(), tensor._version) 
+            for tensor in itertools.chain(self.encoder.parameters(), self.encoder.buffers())
+        )
+
+    def encode(self):
+        with torch.no_grad():
+            for group in self.groups:
+                data = torch.Tensor(group_extract(self.df, group)).float()
+                if self.use_cuda:
+                    data = data.cuda()
+                self.latent[group] = torch.cat([self.encoder(batch) for batch in data.split(self.batch_size)])
+        self._version = self.version()
+
+    def sample(self, group, size=(100, ), replace=False):
+        if self._version != self.version():
+            self.encode()
+        latent = self.latent[group]
+        idx = np.random.choice(np.arange(latent.shape[0]), size=size, replace=replace)
+        return latent[torch.from_numpy(idx).to(latent.device)]
+
+class _LossLedger:
+    '''
+    Detached losses kept on the device in a tensor indexed by (batch, key), copied to the host (a single sync)
+    every `flush_every` batches. The keys are the `(t0, t1)` pairs of `local_losses`, `'batch'` and `'global'`.
+    The losses are recorded multiplied by `scale`.
+    '''
+    def __init__(self, keys, n_batches, device, flush_every=10, scale=1.0):
+        self.scale = scale
+        self.keys = [*keys, 'batch', 'global']
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.values = torch.zeros((n_batches, len(self.keys)), device=device)
+        self.recorded = torch.zeros((n_batches, len(self.keys)), dtype=torch.bool, device=device)
+        self.flush_every = flush_every
+        self.flushed = 0
+
+    def record(self, batch, key, loss):
+        j = self.index[key]
+        self.values[batch, j] = loss.detach() * self.scale
+        self.recorded[batch, j] = True
+
+    def flush(self, batch, local_losses, batch_losses, globe_losses):
+        '''
+        Appends the losses of the batches up to `batch` (included) to the lists of `train`.
+        '''
+        values = self.values[self.flushed:batch + 1].cpu().numpy()
+        recorded = self.recorded[self.flushed:batch + 1].cpu().numpy()
+        for row, mask in zip(values, recorded):
+            for key, value in zip(itertools.compress(self.keys, mask), row[mask]):
+                if key == 'batch':
+                    batch_losses.append(float(value))
+                elif key == 'global':
+                    globe_losses.append(float(value))
+                else:
+                    local_losses[key].append(float(value))
+        self.flushed = batch + 1
+
+class LossHistory:
+    '''
+    The losses of `training_regimen`: one series of local losses per `'t0:t1'` key (see `train`) and the
+    `'batch'` and `'global'` series. Each series is a growable NumPy array, i.e. appends are amortized O(1).
+
+    Notes:
+    ----------
+        - With `path`, `flush` appends the values added since the previous `flush` to one raw float64 file
+            per series in the directory `path` (listed in `path/keys.json`), see `LossHistory.load`.
+            The first `flush` (and the first after `load_state_dict`) rewrites the files.
+    '''
+    _index_file = 'keys.json'
+
+    def __init__(self, keys=(), path=None):
+        self.path = path
+        self._data, self._sizes, self._flushed, self._files = {}, {}, {}, {}
+        self._rewrite = True
+        for key in [*keys, 'batch', 'global']:
+            self._series(key)
+
+    def _series(self, key):
+        if key not in self._data:
+            self._data[key] = np.empty(16)
+            self._sizes[key] = 0
+            self._flushed[key] = 0
+            self._files[key] = f'{key}.f8'.replace(':', '-')
+        return key
+
+    def extend(self, key, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self._series(key)
+        size, data = self._sizes[key], self._data[key]
+        if size + len(values) > len(data):
+            grown = np.empty(max(2 * len(data), size + len(values)))
+            grown[:size] = data[:size]
+            self._data[key] = data = grown
+        data[size:size + len(values)] = values
+        self._sizes[key] = size + len(values)
+
+    def append(self, key, value):
+        self.extend(key, [value])
+
+    def update(self, local_losses=None, batch_losses=None, globe_losses=None):
+        '''
+        Appends the losses returned by `train`.
+        '''
+        for key, values in (local_losses or {}).items():
+            self.extend(key, values)
+        if batch_losses is not None:
+            self.extend('batch', batch_losses)
+        if globe_losses is not None:
+            self.extend('global', globe_losses)
+
+    def __getitem__(self, key):
+        return self._data[key][:self._sizes[key]]
+
+    def __len__(self):
+        return len(self._data)
+
+    def keys(self):
+        return list(self._data)
+
+    @property
+    def local_losses(self):
+        return {key: self[key] for key in self._data if key not in ('batch', 'global')}
+
+    @property
+    def batch_losses(self):
+        return self['batch']
+
+    @property
+    def globe_losses(self):
+        return self['global']
+
+    def interleave_reverse(self, steps, reverse_n):
+        '''
+        The local losses of each `(t0, t1)` of `steps`, with the losses of `(t1, t0)` inserted before every
+        `reverse_n`-th one, i.e. the single series per step of `training_regimen` with `reverse_schema`.
+        '''
+        interleaved = {}
+        for t0, t1 in steps:
+            forward, backward = self[f'{t0}:{t1}'], self[f'{t1}:{t0}']
+            at = np.arange(0, len(forward), reverse_n)
+            interleaved[f'{t0}:{t1}'] = np.insert(forward, at, backward[:len(at)])
+        return interleaved
+
+    def state_dict(self):
+        return {key: self[key].copy() for key in self._data}
+
+    def load_state_dict(self, state):
+        self._data, self._sizes, self._flushed, self._files = {}, {}, {}, {}
+        for key, values in state.items():
+            self.extend(key, values)
+        self._rewrite = True
+
+    def flush(self):
+        if self.path is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, self._index_file), 'w') as f:
+            json.dump(self._files, f)
+        for key in self._data:
+            start = 0 if self._rewrite else self._flushed[key]
+            with open(os.path.join(self.path, self._files[key]), 'wb' if self._rewrite else 'ab') as f:
+                self[key][start:].tofile(f)
+            self._flushed[key] = self._sizes[key]
+        self._rewrite = False
+
+    @classmethod
+    def load(cls, path):
+        '''
+        The history streamed to `path`, further `flush`es append to it.
+        '''
+        with open(os.path.join(path, cls._index_file)) as f:
+            files = json.load(f)
+        history = cls(path=path)
+        for key, file in files.items():
+            history.extend(key, np.fromfile(os.path.join(path, file), dtype=np.float64))
+        history._flushed = dict(history._sizes)
+        history._rewrite = False
+        return history
+
+def _member_sum(loss_fn, dim=0):
+    '''
+    Wraps `loss_fn(pred, ...)` to sum one loss per member of an ensemble prediction (members along `dim`).
+    Since the members share no parameters, each member's gradient is that of its own loss.
+    '''
+    def member_loss(pred, *args, **kwargs):
+        if isinstance(pred, (list, tuple)):
+            pred = torch.stack(pred)
+        return sum([loss_fn(member, *args, **kwargs) for member in pred.unbind(dim)])
+    return member_loss
+
 def train(
     model, df, groups, optimizer, n_batches=20, 
     criterion=MMD_loss(),
@@ -51,7 +289,15 @@ def train(
     use_penalty=False,
     lambda_energy=1.0,
 
-    reverse:bool = False
+    reverse:bool = False,
+    profile_nfe:bool = False,
+
+    multiple_shooting:bool = False,
+    lambda_continuity:float = 0.0,
+
+    embedding_cache = None,
+    flush_every:int = 10,
+    micro_batches:int = 1
 ):
 
     '''
@@ -124,16 +370,66 @@ def train(
         logger (NoneType|Logger): Default to 'None'. The logger to record information.
 
         use_penalty (bool): Defaults to `False`. Whether or not to use $L_e$ during training (norm of the derivative).
+            Requires a `model` with `use_norm=True` (see `ToyModel.energy`), otherwise no penalty is added.
         
         lambda_energy (float): Default to '1.0'. The weight of the energy penalty.
 
         reverse (bool): Whether to train time backwards.
+
+        profile_nfe (bool): Defaults to `False`. Whether or not to count the function evaluations, solver steps
+            and time spent in `model.func` (see `ToyODE`), separately for the forward and adjoint passes. 
+            They are averaged per `(t0, t1)` pair (the whole trajectory for the global loss) and logged with the loss.
+
+        multiple_shooting (bool): Defaults to `False`. For the local loss, whether or not to solve all the `(t0, t1)` 
+            pairs in a single call of the solver, each from its own sample of `t0`, and take a single optimizer step
+            on the sum of the losses. Requires a `model` with a `shooting_forward` method (see `ToyModel`), which
+            solves all the pairs over the unit interval with a time offset per cell. With `MMD_loss` the losses of
+            all the pairs are computed at once on the stacked pairs. Without `lambda_continuity` this is the local 
+            loss with a single optimizer step per batch, `apply_losses_in_time` being the step per pair.
+
+        lambda_continuity (float): Defaults to `0.0`. With `multiple_shooting`, the weight of the continuity penalty.
+            When positive, every interval but the first starts from the end state of the previous interval in the
+            previous solve (the previous batch or micro-batch of this call, real samples at the first one), 
+            so that the starts are propagated from the first timepoint across the batches, approximating the 
+            global loss. The penalty is the criterion between the end state of each interval and the start of 
+            the next one (the defect of the shooting), computed on the states of the model.
+
+        embedding_cache (NoneType|EmbeddingCache): Defaults to `None`. The cells encoded by `autoencoder.encoder`.
+            If given, with either `use_emb` or `use_gae` and without `add_noise`, the encoded samples (the targets
+            for `use_emb`) are drawn from the cache instead of encoding fresh samples at each step.
+
+        flush_every (int): Defaults to `10`. The losses are kept on the device and copied to the returned 
+            `local_losses`, `batch_losses` and `globe_losses` every `flush_every` batches, instead of 
+            synchronizing with the device at every step.
+
+        micro_batches (int): Defaults to `1`. The number of micro-batches of `sample_size` cells per batch. Their gradients are
+            accumulated (each micro-batch is backpropagated, and its graph freed, before the next one), so a batch 
+            of `micro_batches * sample_size` cells only needs the memory of one micro-batch.
+            Since the MMD / OT losses are not additive over cells, the loss of a batch is the average of the losses of 
+            its micro-batches, i.e. an estimate with the bias of `sample_size` cells and the variance of more cells.
+
+    Ensembles:
+        With an ensemble `model` (`model.func.n_members`, see `EnsembleODE`), all the members are solved from the
+        same samples and the losses are the sums of the per-member losses, so one optimizer step trains every member.
+        The recorded (and returned) losses are the means of the per-member losses.
     '''
     if autoencoder is None and (use_emb or use_gae):
         use_emb = False
         use_gae = False
         warnings.warn('\'autoencoder\' is \'None\', but \'use_emb\' or \'use_gae\' is True, both will be set to False.')
 
+    # NOTE: without `use_norm` the model integrates no energy, the penalty is zero
+    if use_penalty and not getattr(model, 'use_norm', False):
+        use_penalty = False
+        warnings.warn('\'use_penalty\' is True, but the model has no \'use_norm\', no penalty will be added.')
+
+    # NOTE: the noise is added in data space, and with both `use_emb` and `use_gae` the targets are encoded twice
+    use_cache = embedding_cache is not None and use_emb != use_gae and not add_noise
+    def sample_data(group, encoded=False):
+        if use_cache and encoded:
+            return embedding_cache.sample(group, size=sample_size, replace=sample_with_replacement)
+        return sample(df, group, size=sample_size, replace=sample_with_replacement, to_torch=True, use_cuda=use_cuda)
+
     noise_fn = torch.randn if use_gaussian else torch.rand
     def noise(data):
         return noise_fn(*data.shape).cuda() if use_cuda else noise_fn(*data.shape)
@@ -155,149 +451,286 @@ def train(
         local_losses = {f'{t0}:{t1}':[] for (t0, t1) in steps}
         
     density_fn = Density_loss(hinge_value) # if not use_local_density else Local_density_loss()
+    # NOTE: these losses also accept stacked pairs, see `multiple_shooting`
+    stack_pairs = isinstance(criterion, MMD_loss) and isinstance(density_fn, Density_loss)
+    n_members = getattr(getattr(model, 'func', None), 'n_members', None)
+    def continuity_fn(pred, start, criterion=criterion):
+        # NOTE: with an ensemble, each member is compared with its own propagated start
+        if n_members is None:
+            return criterion(pred, start)
+        return sum([criterion(p, s) for p, s in zip(pred.unbind(0), start.unbind(0))])
+    if n_members is not None:
+        criterion = _member_sum(criterion)
+        # NOTE: the global density loss takes the whole trajectory, of shape (time, member, ...)
+        density_fn = _member_sum(density_fn, dim=1 if global_loss else 0)
 
     # Send model to cuda and specify it as training mode
     if use_cuda:
         model = model.cuda()
     
     model.train()
+    # NOTE: the losses of an ensemble are recorded per member (their mean), comparable across ensemble sizes
+    ledger = _LossLedger(local_losses, n_batches, 'cuda' if use_cuda else 'cpu', flush_every, 1 / (n_members or 1))
+
+    func = getattr(model, 'func', None)
+    profile_nfe = profile_nfe and hasattr(func, 'reset_nfe')
+    nfe_stats = {}
+    if profile_nfe:
+        func.profile = True
+        func.reset_nfe()
     
+    # NOTE: with `multiple_shooting` and `lambda_continuity`, the end states of the intervals (but the last) 
+    #   of the previous solve, where the next intervals start
+    propagated = None
     for batch in tqdm(range(n_batches)):
         
+        # apply local loss on all the pairs at once
+        if local_loss and not global_loss and multiple_shooting:
+            if hold_one_out:
+                groups = [g for g in groups if g != hold_out]
+                steps = generate_steps(groups)
+            optimizer.zero_grad()
+            pair_losses = []
+            for micro in range(micro_batches):
+                # sample data
+                data_t0 = [sample_data(t0, encoded=use_gae) for (t0, t1) in steps]
+                data_t1 = [sample_data(t1, encoded=True) for (t0, t1) in steps]
+                if add_noise:
+                    data_t0 = [data + noise(data) * noise_scale for data in data_t0]
+                    data_t1 = [data + noise(data) * noise_scale for data in data_t1]
+                if autoencoder is not None and use_gae and not use_cache:
+                    data_t0 = [autoencoder.encoder(data) for data in data_t0]
+                    data_t1 = [autoencoder.encoder(data) for data in data_t1]
+                starts = data_t0
+                if lambda_continuity > 0 and propagated is not None:
+                    # NOTE: an ensemble propagates one state per member, the real start of the first interval is shared
+                    starts = [data_t0[0].expand_as(propagated[0]), *propagated]
+                sizes = [data.shape[-2] for data in starts]
+                time_t0 = torch.cat([torch.full((n, ), float(t0)) for n, (t0, t1) in zip(sizes, steps)])
+                time_t1 = torch.cat([torch.full((n, ), float(t1)) for n, (t0, t1) in zip(sizes, steps)])
+                if use_cuda:
+                    time_t0, time_t1 = time_t0.cuda(), time_t1.cuda()
+
+                # prediction, every interval in a single solve
+                data_tp = model.shooting_forward(torch.cat(starts, dim=-2), time_t0, time_t1)
+                # NOTE: the defects, between the end state of each interval and the start of the next one in this solve
+                continuity = []
+                if lambda_continuity > 0:
+                    ends = data_tp.split(sizes, dim=-2)[:-1]
+                    if starts is not data_t0:
+                        continuity = [continuity_fn(end, start) for end, start in zip(ends, starts[1:])]
+                    propagated = [end.detach() for end in ends]
+                # NOTE: with the same number of cells in each pair, the losses are computed at once on stacked pairs
+                stacked = stack_pairs and len(set(sizes)) == 1
+                if stacked:
+                    data_tp = data_tp.unflatten(-2, (len(sizes), sizes[0]))
+                    data_t1 = torch.stack(data_t1)
+                else:
+                    data_tp = data_tp.split(sizes, dim=-2)
+                if autoencoder is not None and use_emb:
+                    if stacked:
+                        data_tp = autoencoder.encoder(data_tp)
+                        data_t1 = data_t1 if use_cache else autoencoder.encoder(data_t1)
+                    else:
+                        data_tp = [autoencoder.encoder(data) for data in data_tp]
+                        if not use_cache:
+                            data_t1 = [autoencoder.encoder(data) for data in data_t1]
+                if use_penalty:
+                    energy = model.energy.split(sizes, dim=-1)
+
+                if stacked:
+                    losses = criterion(data_tp, data_t1)
+                    if use_density_loss:
+                        losses = losses + lambda_density * density_fn(data_tp, data_t1, top_k=top_k).to(losses.device)
+                    if continuity:
+                        losses = losses + lambda_continuity * torch.stack([*continuity, losses.new_zeros(())])
+                    if use_penalty:
+                        losses = losses + lambda_energy * torch.stack([e.sum() for e in energy])
+                    batch_loss = list(losses.unbind())
+                else:
+                    batch_loss = []
+                    for i, (t0, t1) in enumerate(steps):
+                        loss = criterion(data_tp[i], data_t1[i])
+                        if use_density_loss:
+                            density_loss = density_fn(data_tp[i], data_t1[i], top_k=top_k)
+                            density_loss = density_loss.to(loss.device)
+                            loss += lambda_density * density_loss
+                        if i < len(continuity):
+                            loss += lambda_continuity * continuity[i]
+                        if use_penalty:
+                            loss += lambda_energy * energy[i].sum()
+                        batch_loss.append(loss)
+
+                loss = sum(batch_loss)
+                (loss / micro_batches).backward()
+                if profile_nfe:
+                    _record_nfe(nfe_stats, f'{steps[0][0]}:{steps[-1][1]}', func)
+                pair_losses.append(torch.stack([loss.detach() for loss in batch_loss]))
+            optimizer.step()
+            pair_losses = torch.stack(pair_losses).mean(0)
+            for (t0, t1), loss in zip(steps, pair_losses):
+                ledger.record(batch, f'{t0}:{t1}', loss)
+            ledger.record(batch, 'batch', pair_losses.mean())
+
         # apply local loss
-        if local_loss and not global_loss:
-            # for storing the local loss with calling `.item()` so `loss.backward()` can still be used
+        elif local_loss and not global_loss:
+            # for storing the local losses, so `loss.backward()` can still be used
             batch_loss = []
             if hold_one_out:
                 groups = [g for g in groups if g != hold_out] # TODO: Currently does not work if hold_out='random'. Do to_ignore before. 
                 steps = generate_steps(groups)
+            if not apply_losses_in_time:
+                optimizer.zero_grad()
             for step_idx, (t0, t1) in enumerate(steps):  
                 if hold_out in [t0, t1] and hold_one_out: # TODO: This `if` can be deleted since the groups does not include the ho timepoint anymore
                     continue                              # i.e. it is always False. 
-                optimizer.zero_grad()
+                if apply_losses_in_time:
+                    optimizer.zero_grad()
                 
-                #sampling, predicting, and evaluating the loss.
-                # sample data
-                data_t0 = sample(df, t0, size=sample_size, replace=sample_with_replacement, to_torch=True, use_cuda=use_cuda)
-                data_t1 = sample(df, t1, size=sample_size, replace=sample_with_replacement, to_torch=True, use_cuda=use_cuda)
-                time = torch.Tensor([t0, t1]).cuda() if use_cuda else torch.Tensor([t0, t1])
-
-                if add_noise:
-                    data_t0 += noise(data_t0) * noise_scale
-                    data_t1 += noise(data_t1) * noise_scale
-                if autoencoder is not None and use_gae:
-                    data_t0 = autoencoder.encoder(data_t0)
-                    data_t1 = autoencoder.encoder(data_t1)
-                # prediction
-                data_tp = model(data_t0, time)
-
-                if autoencoder is not None and use_emb:        
-                    data_tp, data_t1 = autoencoder.encoder(data_tp), autoencoder.encoder(data_t1)
-                # loss between prediction and sample t1
-                loss = criterion(data_tp, data_t1)
-
-                if use_density_loss:                
-                    density_loss = density_fn(data_tp, data_t1, top_k=top_k)
-                    density_loss = density_loss.to(loss.device)
-                    loss += lambda_density * density_loss
-
-                if use_penalty:
-                    penalty = sum(model.norm)
-                    loss += lambda_energy * penalty
+                pair_loss = 0
+                for micro in range(micro_batches):
+                    #sampling, predicting, and evaluating the loss.
+                    # sample data
+                    data_t0 = sample_data(t0, encoded=use_gae)
+                    data_t1 = sample_data(t1, encoded=True)
+                    time = torch.Tensor([t0, t1]).cuda() if use_cuda else torch.Tensor([t0, t1])
+
+                    if add_noise:
+                        data_t0 += noise(data_t0) * noise_scale
+                        data_t1 += noise(data_t1) * noise_scale
+                    if autoencoder is not None and use_gae and not use_cache:
+                        data_t0 = autoencoder.encoder(data_t0)
+                        data_t1 = autoencoder.encoder(data_t1)
+                    # prediction
+                    data_tp = model(data_t0, time)
+
+                    if autoencoder is not None and use_emb:        
+                        data_tp = autoencoder.encoder(data_tp)
+                        data_t1 = data_t1 if use_cache else autoencoder.encoder(data_t1)
+                    # loss between prediction and sample t1
+                    loss = criterion(data_tp, data_t1)
+
+                    if use_density_loss:                
+                        density_loss = density_fn(data_tp, data_t1, top_k=top_k)
+                        density_loss = density_loss.to(loss.device)
+                        loss += lambda_density * density_loss
+
+                    if use_penalty:
+                        penalty = model.energy[-1].sum()
+                        loss += lambda_energy * penalty
+
+                    # NOTE: backpropagated right away, also without `apply_losses_in_time` (the gradient of a sum
+                    #   is the sum of the gradients), so the graphs are not kept
+                    (loss / micro_batches).backward()
+                    if profile_nfe:
+                        _record_nfe(nfe_stats, f'{t0}:{t1}', func)
+                    pair_loss = pair_loss + loss.detach() / micro_batches
 
                 # apply local loss as we calculate it
-                if apply_losses_in_time and local_loss:
-                    loss.backward()
+                if apply_losses_in_time:
                     optimizer.step()
-                    model.norm=[]
                 # save loss in storage variables 
-                local_losses[f'{t0}:{t1}'].append(loss.item())
-                batch_loss.append(loss)
+                ledger.record(batch, f'{t0}:{t1}', pair_loss)
+                batch_loss.append(pair_loss)
         
         
             # convert the local losses into a tensor of len(steps)
-            batch_loss = torch.Tensor(batch_loss).float()
-            if use_cuda:
-                batch_loss = batch_loss.cuda()
+            batch_loss = torch.stack(batch_loss)
             
             if not apply_losses_in_time:
-                batch_loss.backward()
                 optimizer.step()
 
-            # store average / sum of local losses for training
-            ave_local_loss = torch.mean(batch_loss)
-            sum_local_loss = torch.sum(batch_loss)            
-            batch_losses.append(ave_local_loss.item())
+            # store average of local losses for training
+            ledger.record(batch, 'batch', torch.mean(batch_loss))
         
         # apply global loss
         elif global_loss and not local_loss:
             optimizer.zero_grad()
-            #sampling, predicting, and evaluating the loss.
-            # sample data
-            data_ti = [
-                sample(
-                    df, group, size=sample_size, replace=sample_with_replacement, 
-                    to_torch=True, use_cuda=use_cuda
-                )
-                for group in groups
-            ]
-            time = torch.Tensor(groups).cuda() if use_cuda else torch.Tensor(groups)
-
-            if add_noise:
+            mean_loss = 0
+            for micro in range(micro_batches):
+                #sampling, predicting, and evaluating the loss.
+                # sample data
+                # NOTE: with `use_emb` the first timepoint is the initial condition, in data space
                 data_ti = [
-                    data + noise(data) * noise_scale for data in data_ti
+                    sample_data(group, encoded=use_gae or i > 0)
+                    for i, group in enumerate(groups)
                 ]
-            if autoencoder is not None and use_gae:
-                data_ti = [autoencoder.encoder(data) for data in data_ti]
-            # prediction
-            data_tp = model(data_ti[0], time, return_whole_sequence=True)
-            if autoencoder is not None and use_emb:        
-                data_tp = [autoencoder.encoder(data) for data in data_tp]
-                data_ti = [autoencoder.encoder(data) for data in data_ti]
-
-            #ignoring one time point
-            to_ignore = None #TODO: This assignment of `to_ingnore`, could be moved at the beginning of the function. 
-            if hold_one_out and hold_out == 'random':
-                to_ignore = np.random.choice(groups)
-            elif hold_one_out and hold_out in groups:
-                to_ignore = hold_out
-            elif hold_one_out:
-                raise ValueError('Unknown group to hold out')
-            else:
-                pass
+                time = torch.Tensor(groups).cuda() if use_cuda else torch.Tensor(groups)
 
-            loss = sum([
-                criterion(data_tp[i], data_ti[i]) 
-                for i in range(1, len(groups))
-                if groups[i] != to_ignore
-            ])
+                if add_noise:
+                    data_ti = [
+                        data + noise(data) * noise_scale for data in data_ti
+                    ]
+                if autoencoder is not None and use_gae and not use_cache:
+                    data_ti = [autoencoder.encoder(data) for data in data_ti]
+                # prediction
+                data_tp = model(data_ti[0], time, return_whole_sequence=True)
+                if autoencoder is not None and use_emb:        
+                    data_tp = [autoencoder.encoder(data) for data in data_tp]
+                    data_ti = [
+                        data if use_cache and i > 0 else autoencoder.encoder(data) 
+                        for i, data in enumerate(data_ti)
+                    ]
+
+                #ignoring one time point, the same for all the micro-batches
+                if micro == 0:
+                    to_ignore = None #TODO: This assignment of `to_ingnore`, could be moved at the beginning of the function. 
+                    if hold_one_out and hold_out == 'random':
+                        to_ignore = np.random.choice(groups)
+                    elif hold_one_out and hold_out in groups:
+                        to_ignore = hold_out
+                    elif hold_one_out:
+                        raise ValueError('Unknown group to hold out')
+                    else:
+                        pass
+
+                loss = sum([
+                    criterion(data_tp[i], data_ti[i]) 
+                    for i in range(1, len(groups))
+                    if groups[i] != to_ignore
+                ])
 
-            if use_density_loss:                
-                density_loss = density_fn(data_tp, data_ti, groups, to_ignore, top_k)
-                density_loss = density_loss.to(loss.device)
-                loss += lambda_density * density_loss
-
-            if use_penalty:
-                penalty = sum([model.norm[-(i+1)] for i in range(1, len(groups))
-                    if groups[i] != to_ignore])
-                loss += lambda_energy * penalty
-                                       
-            loss.backward()
+                if use_density_loss:                
+                    density_loss = density_fn(data_tp, data_ti, groups, to_ignore, top_k)
+                    density_loss = density_loss.to(loss.device)
+                    loss += lambda_density * density_loss
+
+                if use_penalty:
+                    # NOTE: energy integrated over each interval [t_{i-1}, t_i]
+                    energy = torch.diff(model.energy, dim=0)
+                    penalty = sum([energy[i-1].sum() for i in range(1, len(groups))
+                        if groups[i] != to_ignore])
+                    loss += lambda_energy * penalty
+
+                (loss / micro_batches).backward()
+                if profile_nfe:
+                    _record_nfe(nfe_stats, f'{groups[0]}:{groups[-1]}', func)
+                mean_loss = mean_loss + loss.detach() / micro_batches
             optimizer.step()
-            model.norm=[]
 
-            globe_losses.append(loss.item())
+            ledger.record(batch, 'global', mean_loss)
         elif local_loss and global_loss:
             # NOTE: weighted local / global loss has been removed to improve runtime
             raise NotImplementedError()
         else:
             raise ValueError('A form of loss must be specified.')
+
+        if (batch + 1) % flush_every == 0 or batch == n_batches - 1:
+            ledger.flush(batch, local_losses, batch_losses, globe_losses)
                      
     print_loss = globe_losses if global_loss else batch_losses 
     if logger is None:      
         tqdm.write(f'Train loss: {np.round(np.mean(print_loss), 5)}')
     else:
         logger.info(f'Train loss: {np.round(np.mean(print_loss), 5)}')
+
+    if profile_nfe:
+        func.profile = False
+        for key, stats in nfe_stats.items():
+            if logger is None:
+                tqdm.write(_format_nfe(key, stats))
+            else:
+                logger.info(_format_nfe(key, stats))
     return local_losses, batch_losses, globe_losses
 
 # %% ../nbs/05_train.ipynb 4
@@ -305,6 +738,142 @@ from .utils import generate_steps
 import torch.nn as nn
 from tqdm.notebook import tqdm
 import numpy as np
+import copy, queue, threading, time
+
+class _Prefetcher:
+    '''
+    Iterates over `fn(item)` for the `items`, computed ahead (at most `depth` of them) in a background thread.
+    '''
+    def __init__(self, fn, items, depth=2):
+        self.results = queue.Queue(maxsize=depth)
+        self.n_items = len(items)
+        self.thread = threading.Thread(target=self._run, args=(fn, items), daemon=True)
+        self.thread.start()
+
+    def _run(self, fn, items):
+        for item in items:
+            try:
+                self.results.put((fn(item), None))
+            except Exception as error:
+                self.results.put((None, error))
+                return
+
+    def __iter__(self):
+        for _ in range(self.n_items):
+            result, error = self.results.get()
+            if error is not None:
+                raise error
+            yield result
+
+def _ae_losses(model, data, dist_geo, criterion, recon, noise=None):
+    '''
+    The reconstruction and distance losses of `train_ae`, `None` for those not used.
+    '''
+    encode_dt = model.encoder(data if noise is None else data + noise)
+    loss_recon = criterion(model.decoder(encode_dt), data) if recon else None
+    loss_dist = criterion(torch.cdist(encode_dt, encode_dt)**2, dist_geo) if dist_geo is not None else None
+    return loss_recon, loss_dist
+
+def _train_ae_epochs(
+    model, df, groups, optimizer, n_epochs, criterion, dist, recon, use_cuda, sample_size,
+    noise_min_scale, noise_max_scale, to_ignore, accumulate_grad, patience, val_size, prefetch, logger
+):
+    '''
+    `train_ae` with `full_epochs`.
+    '''
+    device = 'cuda' if use_cuda else 'cpu'
+    precomputed = dist is not None and hasattr(dist, 'take')
+    data = torch.tensor(df.drop(columns='samples').values, dtype=torch.float)
+    if use_cuda:
+        data = data.pin_memory()
+    positions = {
+        group: np.random.permutation(np.flatnonzero(df['samples'].values == group)) 
+        for group in groups if group != to_ignore
+    }
+
+    # held-out cells for early stopping, their target distances are computed once
+    val_idx = None
+    if patience is not None:
+        n_val = {group: max(1, int(round(val_size * len(idx)))) for group, idx in positions.items()}
+        val_idx = np.concatenate([idx[:n_val[group]] for group, idx in positions.items()])
+        positions = {group: idx[n_val[group]:] for group, idx in positions.items()}
+        val_data = data[val_idx].to(device)
+        val_geo = None
+        if dist is not None:
+            val_geo = dist.take(val_idx) if precomputed else dist.fit(val_data.cpu().numpy())
+            val_geo = torch.from_numpy(val_geo).float().to(device)
+
+    size = int(np.prod(sample_size))
+    n_batches = math.ceil(max(len(idx) for idx in positions.values()) / size)
+
+    def load(idx):
+        data_ti = data[idx].to(device, non_blocking=True)
+        dist_geo = None
+        if dist is not None:
+            dist_geo = dist.take(idx) if precomputed else dist.fit(data[idx].numpy())
+            dist_geo = torch.from_numpy(dist_geo).float().to(device, non_blocking=True)
+        return data_ti, dist_geo
+
+    losses = []
+    best_loss, best_state, since_best, stopped = np.inf, None, 0, False
+    model.train()
+    for epoch in tqdm(range(n_epochs)):
+        # NOTE: every cell of every timepoint once per epoch, the smaller timepoints are repeated 
+        #   (reshuffled) to fill the `n_batches` minibatches of `size` cells per timepoint.
+        order = {
+            group: np.concatenate([np.random.permutation(idx) for _ in range(math.ceil(n_batches * size / len(idx)))])
+            for group, idx in positions.items()
+        }
+        batches = [
+            np.concatenate([order[group][i * size:(i + 1) * size] for group in positions]) 
+            for i in range(n_batches)
+        ]
+        noise_scale = torch.FloatTensor(1).uniform_(noise_min_scale, noise_max_scale)
+
+        start = time.perf_counter()
+        optimizer.zero_grad()
+        batch_losses = []
+        for i, (data_ti, dist_geo) in enumerate(_Prefetcher(load, batches, depth=prefetch)):
+            noise = (noise_scale * torch.randn(data_ti.size())).to(device)
+            loss_recon, loss_dist = _ae_losses(model, data_ti, dist_geo, criterion, recon, noise)
+            loss = sum([l for l in [loss_recon, loss_dist] if l is not None])
+            (loss / accumulate_grad).backward()
+            if (i + 1) % accumulate_grad == 0 or i == n_batches - 1:
+                optimizer.step()
+                optimizer.zero_grad()
+            batch_losses.append(loss.item())
+        throughput = n_batches * size * len(positions) / (time.perf_counter() - start)
+        # NOTE: one loss per epoch, as with one step per epoch
+        losses.append(np.mean(batch_losses))
+
+        message = f'Epoch {epoch}: train loss {np.round(losses[-1], 5)}, {throughput:.0f} cells/s'
+        if val_idx is not None:
+            model.eval()
+            with torch.no_grad():
+                val_loss = sum([l.item() for l in _ae_losses(model, val_data, val_geo, criterion, recon) if l is not None])
+            model.train()
+            message += f', validation loss {np.round(val_loss, 5)}'
+            if val_loss < best_loss:
+                best_loss, best_state, since_best = val_loss, copy.deepcopy(model.state_dict()), 0
+            else:
+                since_best += 1
+        if logger is None:
+            tqdm.write(message)
+        else:
+            logger.info(message)
+        if val_idx is not None and since_best >= patience:
+            stopped = True
+            break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+        message = f'Stopped at epoch {epoch}, restored' if stopped else 'Restored'
+        message += f' the best validation loss {np.round(best_loss, 5)}'
+        if logger is None:
+            tqdm.write(message)
+        else:
+            logger.info(message)
+    return losses
 
 def train_ae(
     model, df, groups, optimizer,
@@ -314,8 +883,13 @@ def train_ae(
     noise_min_scale=0.09,
     noise_max_scale=0.15,
     hold_one_out:bool=False,
-    hold_out='random'
-    
+    hold_out='random',
+    full_epochs:bool=False,
+    accumulate_grad:int=1,
+    patience=None,
+    val_size:float=0.1,
+    prefetch:int=2,
+    logger=None
 ):
     """
     Geodesic Autoencoder training loop.
@@ -340,6 +914,7 @@ def train_ae(
         criterion (torch.nn). Default to 'nn.MSELoss()'. The criterion to minimize. 
 
         dist (NoneType|Class). Default to 'None'. The distance Class with a 'fit(X)' method for a dataset 'X'. Computes the pairwise distances in 'X'.
+            Or a `PrecomputedDistance` (with a 'take(idx)' method), fitted once on `df`, whose distances between the sampled cells are indexed.
 
         recon (bool): Default to 'True'. Whether or not the apply the reconstruction loss. 
         
@@ -356,10 +931,45 @@ def train_ae(
         hold_one_out (bool): Default to False, whether or not to ignore a timepoint during training.
         
         hold_out (str|int): Default to 'random', the timepoint to hold out, either a specific element of 'groups' or a random one. 
+
+        full_epochs (bool): Default to 'False'. Whether an epoch is one step on `sample_size` points per group, or iterates over 
+            shuffled minibatches of `sample_size` points per group covering all the cells (the smaller groups are repeated).
+            With a random 'hold_out', it is drawn once. The minibatches are loaded (and their distances fitted) ahead in a background thread.
+            The returned losses are still one per epoch, the mean loss of its minibatches.
+        
+        accumulate_grad (int): Default to '1'. With `full_epochs`, the number of minibatches per optimizer step.
+        
+        patience (NoneType|int): Default to 'None'. With `full_epochs`, stops after `patience` epochs without improvement of the loss 
+            on `val_size` of the cells of each group (held out), and restores the best model.
+        
+        val_size (float): Default to '0.1'. The fraction of the cells held out with `patience`.
+        
+        prefetch (int): Default to '2'. With `full_epochs`, the number of minibatches loaded ahead.
+        
+        logger (NoneType|Logger): Default to 'None'. The logger to record the losses and throughput (cells/s) of the `full_epochs`.
     
     """
+    if full_epochs:
+        to_ignore = None
+        if hold_one_out and hold_out == 'random':
+            to_ignore = np.random.choice(groups)
+        elif hold_one_out and hold_out in groups:
+            to_ignore = hold_out
+        elif hold_one_out:
+            raise ValueError('Unknown group to hold out')
+        return _train_ae_epochs(
+            model, df, groups, optimizer, n_epochs, criterion, dist, recon, use_cuda, sample_size,
+            noise_min_scale, noise_max_scale, to_ignore, accumulate_grad, patience, val_size, prefetch, logger
+        )
+
     steps = generate_steps(groups)
     losses = []
+    
+    # NOTE: a precomputed distance needs the positions in `df` of the sampled cells
+    precomputed = dist is not None and hasattr(dist, 'take')
+    if precomputed:
+        data = torch.tensor(df.drop(columns='samples').values, dtype=torch.float)
+        positions = {group: np.flatnonzero(df['samples'].values == group) for group in groups}
 
     model.train()
     for epoch in tqdm(range(n_epochs)):
@@ -378,7 +988,15 @@ def train_ae(
         # Training
         optimizer.zero_grad()
         noise_scale = torch.FloatTensor(1).uniform_(noise_min_scale, noise_max_scale)
-        data_ti = torch.vstack([sample(df, group, size=sample_size, replace=sample_with_replacement, to_torch=True, use_cuda=use_cuda) for group in groups if group != to_ignore])
+        if precomputed:
+            # same draws as `sample`
+            idx = np.concatenate([
+                positions[group][np.random.choice(np.arange(len(positions[group])), size=sample_size, replace=sample_with_replacement)].ravel()
+                for group in groups if group != to_ignore
+            ])
+            data_ti = data[idx].cuda() if use_cuda else data[idx]
+        else:
+            data_ti = torch.vstack([sample(df, group, size=sample_size, replace=sample_with_replacement, to_torch=True, use_cuda=use_cuda) for group in groups if group != to_ignore])
         noise = (noise_scale*torch.randn(data_ti.size())).cuda() if use_cuda else noise_scale*torch.randn(data_ti.size())
         
         encode_dt = model.encoder(data_ti + noise)
@@ -392,7 +1010,7 @@ def train_ae(
                 tqdm.write(f'Train loss recon: {np.round(np.mean(loss_recon.item()), 5)}')
         
         if dist is not None:
-            dist_geo = dist.fit(data_ti.cpu().numpy())
+            dist_geo = dist.take(idx) if precomputed else dist.fit(data_ti.cpu().numpy())
             dist_geo = torch.from_numpy(dist_geo).float().cuda() if use_cuda else torch.from_numpy(dist_geo).float()
             dist_emb = torch.cdist(encode_dt,encode_dt)**2
             loss_dist = criterion(dist_emb,dist_geo)
@@ -408,8 +1026,129 @@ def train_ae(
     return losses
 
 # %% ../nbs/05_train.ipynb 5
+import copy, threading
 from .plots import plot_comparision, plot_losses
 from .eval import generate_plot_data
+from .utils import get_rng_states, set_rng_states
+from .exp import exp_checkpoint_filename
+from .parallel import PlotWorker
+
+def _snapshot(obj):
+    '''
+    Copy of `obj` (e.g. a `state_dict`) whose tensors are detached CPU copies, unaffected by further training.
+    '''
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: _snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(v) for v in obj)
+    return obj
+
+class _CheckpointWriter:
+    '''
+    Saves checkpoints to `path` in a background thread, one at a time. Each checkpoint is written to a temporary
+    file then renamed, so an interrupted write leaves the previous checkpoint intact.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.thread = None
+        self.error = None
+
+    def _write(self, checkpoint):
+        try:
+            tmp = f'{self.path}.tmp'
+            torch.save(checkpoint, tmp)
+            os.replace(tmp, self.path)
+        except Exception as error:
+            self.error = error
+
+    def write(self, checkpoint):
+        self.wait()
+        self.thread = threading.Thread(target=self._write, args=(checkpoint, ), name='checkpoint-writer')
+        self.thread.start()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+class ConvergenceMonitor:
+    '''
+    Detects the plateau of loss series updated once per epoch, e.g. the mean loss of each pair of timepoints.
+    Each series is smoothed by an exponential moving average (EMA), and has converged after `patience` updates
+    without an improvement of its best smoothed loss by at least `min_delta` (relative).
+    `update` returns whether all the series seen so far have converged.
+
+    Arguments:
+    ----------
+        patience (int): Defaults to `5`. The number of updates without improvement of a converged series.
+        min_delta (float): Defaults to `1e-3`. The minimum relative decrease of the smoothed loss counting as an improvement.
+        smoothing (float): Defaults to `0.5`. The weight of the previous average in the EMA, `0` to disable the smoothing.
+        min_epochs (int): Defaults to `0`. The minimum number of updates before convergence.
+    '''
+    def __init__(self, patience=5, min_delta=1e-3, smoothing=0.5, min_epochs=0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.smoothing = smoothing
+        self.min_epochs = min_epochs
+        self.reset()
+
+    def reset(self):
+        self.ema, self.best, self.since_best = {}, {}, {}
+        self.n_updates = 0
+
+    def update(self, losses):
+        '''
+        Arguments:
+        ----------
+            losses (dict): the loss of each series at this epoch, series without loss at this epoch are left out.
+        Returns:
+        ----------
+            converged (bool)
+        '''
+        for key, loss in losses.items():
+            ema = loss if key not in self.ema else self.smoothing * self.ema[key] + (1 - self.smoothing) * loss
+            self.ema[key] = ema
+            best = self.best.get(key)
+            if best is None or ema < best - self.min_delta * abs(best):
+                self.best[key], self.since_best[key] = ema, 0
+            else:
+                self.since_best[key] += 1
+        if len(losses) > 0:
+            self.n_updates += 1
+        return self.converged
+
+    @property
+    def converged(self):
+        return (
+            self.n_updates >= self.min_epochs and len(self.since_best) > 0 
+            and all(n >= self.patience for n in self.since_best.values())
+        )
+
+    def state_dict(self):
+        return copy.deepcopy(dict(ema=self.ema, best=self.best, since_best=self.since_best, n_updates=self.n_updates))
+
+    def load_state_dict(self, state):
+        state = copy.deepcopy(state)
+        self.ema, self.best, self.since_best = state['ema'], state['best'], state['since_best']
+        self.n_updates = state['n_updates']
+
+def _all_ranks_mean(losses):
+    '''
+    The mean of `losses` (a dict of floats) over the processes of the default `torch.distributed` process group 
+    if any (see `run_data_parallel`), so that every process takes the same decisions.
+    '''
+    if not (torch.distributed.is_available() and torch.distributed.is_initialized()):
+        return losses
+    keys = sorted(losses)
+    values = torch.tensor([losses[key] for key in keys], dtype=torch.float64)
+    torch.distributed.all_reduce(values)
+    values /= torch.distributed.get_world_size()
+    return dict(zip(keys, values.tolist()))
 
 def training_regimen(
     n_local_epochs, n_epochs, n_post_local_epochs,
@@ -430,6 +1169,9 @@ def training_regimen(
     logger=None, 
     add_noise=False, noise_scale=0.1, use_gaussian=True,  
     use_penalty=False, lambda_energy=1.0,
+    profile_nfe=False,
+    multiple_shooting=False, lambda_continuity=0.0,
+    cache_embeddings=True,
     # END: train params
 
 
@@ -437,35 +1179,127 @@ def training_regimen(
     steps=None, plot_every=None,
     n_points=100, n_trajectories=100, n_bins=100, 
     local_losses=None, batch_losses=None, globe_losses=None,
-    reverse_schema=True, reverse_n=4
+    reverse_schema=True, reverse_n=4,
+    checkpoint_every=None, resume=False, async_plots=False, stream_losses=True,
+    early_stopping=None
 ):
+    # NOTE: with `checkpoint_every`, the state of the regimen (model, optimizer, losses, RNG states, phase and epoch)
+    #   is saved every `checkpoint_every` epochs and at the end of each phase to `exp_checkpoint_filename(exp_dir)`.
+    #   With `resume`, the regimen continues from that checkpoint when it exists.
+    #   With `async_plots`, the plots of `plot_every` are generated and drawn by a `PlotWorker`, a process started
+    #   with 'spawn': a script must then guard its training with `if __name__ == '__main__':`, and a plot is skipped
+    #   when the worker is still busy with the previous ones (see `PlotWorker`).
+    #   With `stream_losses`, the `LossHistory` is streamed to `<exp_dir>/losses` after each epoch.
+    #   With `early_stopping`, a `ConvergenceMonitor` (or a dict of them for some of the phases 'local', 'global'
+    #   and 'post'), a phase ends once its losses have converged: the mean loss of each pair of timepoints 
+    #   (the reverse epochs of `reverse_schema` are not monitored) in the local phases, the global loss otherwise.
+    #   With `run_data_parallel`, the losses are averaged over the processes, which all stop at the same epoch.
     recon = use_gae and not use_emb
+    # NOTE: the autoencoder is frozen, its embeddings are computed once for all the calls of `train`
+    embedding_cache = None
+    if cache_embeddings and autoencoder is not None and (use_emb or use_gae):
+        embedding_cache = EmbeddingCache(df, autoencoder.encoder, use_cuda=use_cuda)
     if steps is None:
         steps = generate_steps(groups)
         
-    if local_losses is None:
-        if hold_one_out and hold_out in groups:
-            groups_ho = [g for g in groups if g != hold_out]
-            local_losses = {f'{t0}:{t1}':[] for (t0, t1) in generate_steps(groups_ho) if hold_out not in [t0, t1]}
-            if reverse_schema:
-                local_losses = {
-                    **local_losses, 
-                    **{f'{t0}:{t1}':[] for (t0, t1) in generate_steps(groups_ho[::-1]) if hold_out not in [t0, t1]}
-                }
+    if hold_one_out and hold_out in groups:
+        groups_ho = [g for g in groups if g != hold_out]
+        keys = [f'{t0}:{t1}' for (t0, t1) in generate_steps(groups_ho) if hold_out not in [t0, t1]]
+        if reverse_schema:
+            keys += [f'{t0}:{t1}' for (t0, t1) in generate_steps(groups_ho[::-1]) if hold_out not in [t0, t1]]
+    else:
+        keys = [f'{t0}:{t1}' for (t0, t1) in generate_steps(groups)]
+        if reverse_schema:
+            keys += [f'{t0}:{t1}' for (t0, t1) in generate_steps(groups[::-1])]
+    history = LossHistory(keys, path=os.path.join(exp_dir, 'losses') if stream_losses else None)
+    history.update(local_losses, batch_losses, globe_losses)
+    pairs = generate_steps([g for g in groups if g != hold_out]) if hold_one_out else generate_steps(groups)
+
+    phases = ['local', 'global', 'post']
+    if not isinstance(early_stopping, dict):
+        early_stopping = {phase: early_stopping for phase in phases}
+    monitors = [copy.deepcopy(early_stopping.get(phase)) for phase in phases]
+    n_saved = [0, 0, 0]
+    def converged(phase, epoch, n, l_loss, b_loss, g_loss):
+        monitor = monitors[phase]
+        if monitor is None:
+            return False
+        if phases[phase] == 'global':
+            losses = {'global': np.mean(g_loss if len(g_loss) > 0 else b_loss)}
         else:
-            local_losses = {f'{t0}:{t1}':[] for (t0, t1) in generate_steps(groups)}
-            if reverse_schema:
-                local_losses = {
-                    **local_losses, 
-                    **{f'{t0}:{t1}':[] for (t0, t1) in generate_steps(groups[::-1])}
-                }
-    if batch_losses is None:
-        batch_losses = []
-    if globe_losses is None:
-        globe_losses = []
+            losses = {f'{t0}:{t1}': np.mean(l_loss[f'{t0}:{t1}']) for (t0, t1) in pairs if len(l_loss.get(f'{t0}:{t1}', [])) > 0}
+        if not monitor.update(_all_ranks_mean(losses)):
+            return False
+        n_saved[phase] = n - epoch - 1
+        message = f'Phase {phases[phase]} converged at epoch {epoch}, {n_saved[phase]} of {n} epochs saved'
+        if logger is None:
+            tqdm.write(message)
+        else:
+            logger.info(message)
+        return True
+
+    # the first epoch of each phase (local pretraining, global training, local posttraining)
+    starts = [0, 0, 0]
+    checkpoint_file = exp_checkpoint_filename(exp_dir)
+    if resume and os.path.exists(checkpoint_file):
+        checkpoint = torch.load(checkpoint_file, map_location='cpu', weights_only=False)
+        model.load_state_dict(checkpoint['model'])
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        history.load_state_dict(checkpoint['losses'])
+        set_rng_states(checkpoint['rng_states'])
+        phase, epoch = checkpoint['phase'], checkpoint['epoch']
+        if monitors[phase] is not None and checkpoint.get('monitor') is not None:
+            monitors[phase].load_state_dict(checkpoint['monitor'])
+        starts = [
+            n if i < phase else epoch + 1 if i == phase else 0 
+            for i, n in enumerate([n_local_epochs, n_epochs, n_post_local_epochs])
+        ]
+        if logger is not None:
+            logger.info(f'Resuming from {checkpoint_file} (phase {phase}, epoch {epoch})')
+    elif resume and logger is not None:
+        logger.info(f'No checkpoint at {checkpoint_file}, starting from scratch')
+
+    writer = _CheckpointWriter(checkpoint_file) if checkpoint_every is not None else None
+    def save_checkpoint(phase, epoch, n):
+        if writer is None or ((epoch + 1) % checkpoint_every != 0 and epoch != n - 1):
+            return
+        # NOTE: the copy is made now, the (slow) write happens while training continues
+        writer.write(_snapshot(dict(
+            model=model.state_dict(), optimizer=optimizer.state_dict(), 
+            losses=history.state_dict(),
+            rng_states=get_rng_states(), phase=phase, epoch=epoch,
+            monitor=monitors[phase].state_dict() if monitors[phase] is not None else None
+        )))
+    
+    plotter = None
+    if plot_every is not None and async_plots:
+        plotter = PlotWorker(
+            model, df, exp_dir, n_points, n_trajectories, n_bins, 
+            sample_with_replacement=sample_with_replacement, autoencoder=autoencoder, recon=recon, logger=logger
+        )
+    def plot(file):
+        if plotter is not None:
+            plotter.submit(model, file)
+            return
+        generated, trajectories = generate_plot_data(
+            model, df, n_points, n_trajectories, n_bins, 
+            sample_with_replacement=sample_with_replacement, use_cuda=use_cuda, 
+            samples_key='samples', logger=logger,
+            autoencoder=autoencoder, recon=recon
+        )
+        plot_comparision(
+            df, generated, trajectories,
+            palette = 'viridis', df_time_key='samples',
+            save=True, path=exp_dir, file=file,
+            x='d1', y='d2', z='d3', is_3d=False
+        )
+    
+    def size_at(epoch):
+        # NOTE: `sample_size` can be a function of the epoch (counted over the phases), e.g. a `SampleSizeCurriculum`
+        return sample_size(epoch) if callable(sample_size) else sample_size
     
     reverse = False
-    for epoch in tqdm(range(n_local_epochs), desc='Pretraining Epoch'):
+    for epoch in tqdm(range(starts[0], n_local_epochs), desc='Pretraining Epoch'):
         reverse = True if reverse_schema and epoch % reverse_n == 0 else False
 
         l_loss, b_loss, g_loss = train(
@@ -476,31 +1310,25 @@ def training_regimen(
             hinge_value=hinge_value,
             use_density_loss = use_density_loss,    
             top_k = top_k, lambda_density = lambda_density, 
-            autoencoder = autoencoder, use_emb = use_emb, use_gae = use_gae, sample_size=sample_size, 
+            autoencoder = autoencoder, use_emb = use_emb, use_gae = use_gae, sample_size=size_at(epoch), 
             sample_with_replacement=sample_with_replacement, logger=logger,
             add_noise=add_noise, noise_scale=noise_scale, use_gaussian=use_gaussian, 
-            use_penalty=use_penalty, lambda_energy=lambda_energy, reverse=reverse
+            use_penalty=use_penalty, lambda_energy=lambda_energy, reverse=reverse,
+            profile_nfe=profile_nfe,
+            multiple_shooting=multiple_shooting, lambda_continuity=lambda_continuity,
+            embedding_cache=embedding_cache
         )
-        for k, v in l_loss.items():  
-            local_losses[k].extend(v)
-        batch_losses.extend(b_loss)
-        globe_losses.extend(g_loss)
+        history.update(l_loss, b_loss, g_loss)
+        history.flush()
         if plot_every is not None and epoch % plot_every == 0:
-            generated, trajectories = generate_plot_data(
-                model, df, n_points, n_trajectories, n_bins, 
-                sample_with_replacement=sample_with_replacement, use_cuda=use_cuda, 
-                samples_key='samples', logger=logger,
-                autoencoder=autoencoder, recon=recon
-            )
-            plot_comparision(
-                df, generated, trajectories,
-                palette = 'viridis', df_time_key='samples',
-                save=True, path=exp_dir, 
-                file=f'2d_comparision_local_{epoch}.png',
-                x='d1', y='d2', z='d3', is_3d=False
-            )
-
-    for epoch in tqdm(range(n_epochs), desc='Epoch'):
+            plot(f'2d_comparision_local_{epoch}.png')
+        if converged(0, epoch, n_local_epochs, l_loss, b_loss, g_loss):
+            # NOTE: checkpointed as the end of the phase, a resumed regimen starts at the next phase
+            save_checkpoint(0, n_local_epochs - 1, n_local_epochs)
+            break
+        save_checkpoint(0, epoch, n_local_epochs)
+
+    for epoch in tqdm(range(starts[1], n_epochs), desc='Epoch'):
         reverse = True if reverse_schema and epoch % reverse_n == 0 else False
         l_loss, b_loss, g_loss = train(
             model, df, groups, optimizer, n_batches, 
@@ -510,31 +1338,25 @@ def training_regimen(
             hinge_value=hinge_value,
             use_density_loss = use_density_loss,       
             top_k = top_k, lambda_density = lambda_density, 
-            autoencoder = autoencoder, use_emb = use_emb, use_gae = use_gae, sample_size=sample_size, 
+            autoencoder = autoencoder, use_emb = use_emb, use_gae = use_gae, sample_size=size_at(n_local_epochs + epoch), 
             sample_with_replacement=sample_with_replacement, logger=logger, 
             add_noise=add_noise, noise_scale=noise_scale, use_gaussian=use_gaussian,
-            use_penalty=use_penalty, lambda_energy=lambda_energy, reverse=reverse
+            use_penalty=use_penalty, lambda_energy=lambda_energy, reverse=reverse,
+            profile_nfe=profile_nfe,
+            multiple_shooting=multiple_shooting, lambda_continuity=lambda_continuity,
+            embedding_cache=embedding_cache
         )
-        for k, v in l_loss.items():  
-            local_losses[k].extend(v)
-        batch_losses.extend(b_loss)
-        globe_losses.extend(g_loss)
+        history.update(l_loss, b_loss, g_loss)
+        history.flush()
         if plot_every is not None and epoch % plot_every == 0:
-            generated, trajectories = generate_plot_data(
-                model, df, n_points, n_trajectories, n_bins, 
-                sample_with_replacement=sample_with_replacement, use_cuda=use_cuda, 
-                samples_key='samples', logger=logger,
-                autoencoder=autoencoder, recon=recon
-            )
-            plot_comparision(
-                df, generated, trajectories,
-                palette = 'viridis', df_time_key='samples',
-                save=True, path=exp_dir, 
-                file=f'2d_comparision_local_{n_local_epochs}_global_{epoch}.png',
-                x='d1', y='d2', z='d3', is_3d=False
-            )
-        
-    for epoch in tqdm(range(n_post_local_epochs), desc='Posttraining Epoch'):
+            plot(f'2d_comparision_local_{n_local_epochs}_global_{epoch}.png')
+        if converged(1, epoch, n_epochs, l_loss, b_loss, g_loss):
+            # NOTE: checkpointed as the end of the phase, a resumed regimen starts at the next phase
+            save_checkpoint(1, n_epochs - 1, n_epochs)
+            break
+        save_checkpoint(1, epoch, n_epochs)
+        
+    for epoch in tqdm(range(starts[2], n_post_local_epochs), desc='Posttraining Epoch'):
         reverse = True if reverse_schema and epoch % reverse_n == 0 else False
 
         l_loss, b_loss, g_loss = train(
@@ -545,60 +1367,43 @@ def training_regimen(
             hinge_value=hinge_value,
             use_density_loss = use_density_loss,       
             top_k = top_k, lambda_density = lambda_density,  
-            autoencoder = autoencoder, use_emb = use_emb, use_gae = use_gae, sample_size=sample_size, 
+            autoencoder = autoencoder, use_emb = use_emb, use_gae = use_gae, sample_size=size_at(n_local_epochs + n_epochs + epoch), 
             sample_with_replacement=sample_with_replacement, logger=logger, 
             add_noise=add_noise, noise_scale=noise_scale, use_gaussian=use_gaussian,
-            use_penalty=use_penalty, lambda_energy=lambda_energy, reverse=reverse
+            use_penalty=use_penalty, lambda_energy=lambda_energy, reverse=reverse,
+            profile_nfe=profile_nfe,
+            multiple_shooting=multiple_shooting, lambda_continuity=lambda_continuity,
+            embedding_cache=embedding_cache
         )
-        for k, v in l_loss.items():  
-            local_losses[k].extend(v)
-        batch_losses.extend(b_loss)
-        globe_losses.extend(g_loss)
+        history.update(l_loss, b_loss, g_loss)
+        history.flush()
         if plot_every is not None and epoch % plot_every == 0:
-            generated, trajectories = generate_plot_data(
-                model, df, n_points, n_trajectories, n_bins, 
-                sample_with_replacement=sample_with_replacement, use_cuda=use_cuda, 
-                samples_key='samples', logger=logger,
-                autoencoder=autoencoder, recon=recon
-            )
-            plot_comparision(
-                df, generated, trajectories,
-                palette = 'viridis', df_time_key='samples',
-                save=True, path=exp_dir, 
-                file=f'2d_comparision_local_{n_local_epochs}_global_{n_epochs}_post_{epoch}.png',
-                x='d1', y='d2', z='d3', is_3d=False
-            )
-
-    if reverse_schema:
-        _temp = {}
-        if hold_one_out:
-            for (t0, t1) in generate_steps([g for g in groups if g != hold_out]):
-                a = f'{t0}:{t1}'
-                b = f'{t1}:{t0}'
-                _temp[a] = []
-                for i, value in enumerate(local_losses[a]):
-
-                    if i % reverse_n == 0:
-                        _temp[a].append(local_losses[b].pop(0))
-                        _temp[a].append(value)
-                    else:
-                        _temp[a].append(value)
-            local_losses = _temp
+            plot(f'2d_comparision_local_{n_local_epochs}_global_{n_epochs}_post_{epoch}.png')
+        if converged(2, epoch, n_post_local_epochs, l_loss, b_loss, g_loss):
+            # NOTE: checkpointed as the end of the phase, a resumed regimen starts at the next phase
+            save_checkpoint(2, n_post_local_epochs - 1, n_post_local_epochs)
+            break
+        save_checkpoint(2, epoch, n_post_local_epochs)
+
+    if writer is not None:
+        writer.wait()
+    if plotter is not None:
+        plotter.close()
+
+    if sum(n_saved) > 0:
+        message = f'Early stopping saved {sum(n_saved)} of {n_local_epochs + n_epochs + n_post_local_epochs} epochs'
+        if logger is None:
+            tqdm.write(message)
         else:
-            for (t0, t1) in generate_steps(groups):
-                a = f'{t0}:{t1}'
-                b = f'{t1}:{t0}'
-                _temp[a] = []
-                for i, value in enumerate(local_losses[a]):
-
-                    if i % reverse_n == 0:
-                        _temp[a].append(local_losses[b].pop(0))
-                        _temp[a].append(value)
-                    else:
-                        _temp[a].append(value)
-            local_losses = _temp
-
+            logger.info(message)
 
+    if reverse_schema:
+        local_losses = history.interleave_reverse(pairs, reverse_n)
+    else:
+        local_losses = history.local_losses
+    # NOTE: returned as lists, like those of `train`
+    local_losses = {key: values.tolist() for key, values in local_losses.items()}
+    batch_losses, globe_losses = history.batch_losses.tolist(), history.globe_losses.tolist()
 
     if plot_every is not None:
         plot_losses(
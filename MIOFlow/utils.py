@@ -1,13 +1,14 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/02_utils.ipynb.
 
 # %% auto 0
-__all__ = ['group_extract', 'sample', 'to_np', 'generate_steps', 'set_seeds', 'config_hold_out', 'config_criterion',
-           'get_groups_from_df', 'get_cell_types_from_df', 'get_sample_n_from_df', 'get_times_from_groups']
+__all__ = ['group_extract', 'sample', 'to_np', 'generate_steps', 'set_seeds', 'get_rng_states', 'set_rng_states', 'compile_fn',
+           'config_hold_out', 'config_criterion', 'get_groups_from_df', 'get_cell_types_from_df',
+           'get_sample_n_from_df', 'get_times_from_groups']
 
 # %% ../nbs/02_utils.ipynb 3
 import numpy as np, pandas as pd
 import torch
-import random
+import random, warnings
 
 def group_extract(df, group, index='samples', groupby='samples'):
     return df.groupby(groupby).get_group(group).set_index(index).values
@@ -33,6 +34,72 @@ def set_seeds(seed:int):
     random.seed(seed)
     np.random.seed(seed)
 
+def get_rng_states():
+    '''
+    The states of the generators seeded by `set_seeds` (and of the CUDA generators), see `set_rng_states`.
+    '''
+    return {
+        'torch': torch.get_rng_state(),
+        'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+        'numpy': np.random.get_state(),
+        'random': random.getstate(),
+    }
+
+def set_rng_states(states):
+    torch.set_rng_state(states['torch'])
+    if states['cuda'] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(states['cuda'])
+    np.random.set_state(states['numpy'])
+    random.setstate(states['random'])
+
+class _CompiledFn:
+    def __init__(self, fn, **kwargs):
+        self.fn = fn
+        self.kwargs = kwargs
+        self.name = getattr(fn, '__qualname__', repr(fn))
+        self.compiled = torch.compile(fn, **kwargs) if hasattr(torch, 'compile') else None
+        self.first_call = True
+        if self.compiled is None:
+            warnings.warn(f'torch.compile is not available, {self.name} will not be compiled.')
+
+    # NOTE: the compiled function cannot be pickled (e.g. `torch.save` or `copy.deepcopy` of a model), 
+    #   the eager function is and it is compiled again (lazily, at the first call) when unpickled
+    def __getstate__(self):
+        return {'fn': self.fn, 'kwargs': self.kwargs, 'name': self.name, 'compile': self.compiled is not None}
+
+    def __setstate__(self, state):
+        self.fn, self.kwargs, self.name = state['fn'], state['kwargs'], state['name']
+        self.compiled = torch.compile(self.fn, **self.kwargs) if state['compile'] else None
+        self.first_call = True
+
+    def __call__(self, *args, **kwargs):
+        if self.compiled is None:
+            return self.fn(*args, **kwargs)
+        if not self.first_call:
+            return self.compiled(*args, **kwargs)
+        # NOTE: only the errors of the compiler at the first call fall back, the others (e.g. of `fn`) are raised
+        try:
+            result = self.compiled(*args, **kwargs)
+        except _compiler_errors() as e:
+            warnings.warn(f'Compiling {self.name} failed, falling back to eager mode: {e}')
+            self.compiled = None
+            result = self.fn(*args, **kwargs)
+        self.first_call = False
+        return result
+
+def _compiler_errors():
+    import torch._dynamo
+    names = 'BackendCompilerFailed Unsupported InternalTorchDynamoError InvalidBackend'.split()
+    return tuple(getattr(torch._dynamo.exc, name) for name in names if hasattr(torch._dynamo.exc, name))
+
+def compile_fn(fn, **kwargs):
+    '''
+    Wraps `fn` with `torch.compile` (`kwargs` are passed to it). If compilation is unavailable 
+    or the compiler fails at the first call, warns and falls back to calling `fn` directly. 
+    Any other error (e.g. raised by `fn`) is raised.
+    '''
+    return _CompiledFn(fn, **kwargs)
+
 def config_hold_out(df:pd.DataFrame, hold_out:str='random', hold_one_out:bool=False):
     DF = None
     if not hold_one_out: # NOTE: we use all data